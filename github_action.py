@@ -14,73 +14,14 @@ import plotly.graph_objects as go
 import plotly.io as pio
 import pickle
 import os
+import sys
 
-pio.templates.default = "plotly_dark"
-
-
-def get_data():
-    filenames = [
-        "time_series_covid19_confirmed_global.csv",
-        "time_series_covid19_deaths_global.csv",
-        "time_series_covid19_recovered_global.csv",
-    ]
-    url = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
-    confirmed_global = pd.read_csv(url + filenames[0])
-
-    deaths_global = pd.read_csv(url + filenames[1])
-
-    recovered_global = pd.read_csv(url + filenames[2])
-
-    country_cases = pd.read_csv(
-        "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/web-data/data/cases_country.csv"
-    )
-
-    confirmed_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
-
-    deaths_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
 
-    recovered_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
+import store
+from ingest import get_data
 
-    country_cases.drop(
-        columns=[
-            "Last_Update",
-            "Incident_Rate",
-            "People_Tested",
-            "People_Hospitalized",
-            "UID",
-        ],
-        inplace=True,
-    )
-
-    confirmed_global.rename(columns={"Country/Region": "country"}, inplace=True)
-    deaths_global.rename(columns={"Country/Region": "country"}, inplace=True)
-    recovered_global.rename(columns={"Country/Region": "country"}, inplace=True)
-
-    country_cases.rename(
-        columns={
-            "Country_Region": "country",
-            "Confirmed": "confirmed",
-            "Deaths": "deaths",
-            "Recovered": "recovered",
-            "Active": "active",
-            "Mortality_Rate": "mortality",
-        },
-        inplace=True,
-    )
-
-    confirmed_global = confirmed_global.groupby(["country"], as_index=False).sum()
-    deaths_global = deaths_global.groupby(["country"], as_index=False).sum()
-    recovered_global = recovered_global.groupby(["country"], as_index=False).sum()
-
-    recovered = recovered_global.groupby("country").sum().T
-    deaths = deaths_global.groupby("country").sum().T
-    confirmed = confirmed_global.groupby("country").sum().T
-
-    deaths.index = pd.to_datetime(deaths.index, infer_datetime_format=True)
-    recovered.index = pd.to_datetime(recovered.index, infer_datetime_format=True)
-    confirmed.index = pd.to_datetime(confirmed.index, infer_datetime_format=True)
-
-    return deaths, recovered, confirmed
+pio.templates.default = "plotly_dark"
 
 
 def create_data_frame(dataframe, country):
@@ -345,6 +286,9 @@ def cnn_predict(df_name, country):
     return fig, MASE, predictions
 
 
+# Bringing the store up to date before forecasting from it
+store.refresh()
+
 countries = ["India", "US", "Brazil", "Canada", "United Kingdom", "Germany"]
 
 dfs = ["confirmed", "recovered", "deaths"]
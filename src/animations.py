@@ -1,87 +1,126 @@
 # Imports
-import app_vars as av
+import snapshot
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
 
-confirmed_global, deaths_global, recovered_global, country_cases_sorted = (
-    av.confirmed_global,
-    av.deaths_global,
-    av.recovered_global,
-    av.country_cases_sorted,
-)
 
-
-def unpivot(df):
-    return df.melt(id_vars=["country"], value_vars=df.columns[1:])
-
-
-def take_top10(df):
-    top = list(
-        df[df["variable"] == df["variable"][df.index[-1]]]
-        .sort_values(by=["value"], ascending=False)
-        .head(10)["country"]
-    )
-    df = df[df["country"].isin(top)]
-    return df
+def top_k(values, k=10):
+    # The k largest countries of every date of a (countries, dates) matrix in one
+    # call, returned as (dates, k) arrays of country positions and counts, largest first
+    k = min(k, values.shape[0])
+    if values.dtype.kind == "f":
+        # Countries without a value, such as a per capita count without a population, rank last
+        values = np.nan_to_num(values, nan=0.0)
+    top = np.argpartition(values, values.shape[0] - k, axis=0)[-k:]
+    counts = np.take_along_axis(values, top, axis=0)
+    order = np.argsort(-counts, axis=0, kind="stable")
+    top = np.take_along_axis(top, order, axis=0)
+    counts = np.take_along_axis(counts, order, axis=0)
+    return top.T, counts.T
+
+
+def compare(*countries):
+    # (dates, values) where values is (countries, dates, metrics) for the given
+    # countries, gathered from the cube in one indexing operation
+    cube = snapshot.current().cube
+    rows = [cube.index[country] for country in countries]
+    return cube.dates, cube.values[rows]
+
+
+def days_since(values, n=100, metric="confirmed"):
+    # Shifts every country so that day 0 is the first day its metric reached n,
+    # the days after a country's data runs out (or before it reaches n) are NaN
+    reached = values[:, :, snapshot.current().cube.metric_index[metric]] >= n
+    start = np.where(reached.any(axis=1), reached.argmax(axis=1), values.shape[1])
+    days = np.arange(values.shape[1] - start.min()) if len(start) else np.arange(0)
+    positions = start[:, np.newaxis] + days
+    valid = positions < values.shape[1]
+    aligned = np.take_along_axis(
+        values,
+        np.minimum(positions, values.shape[1] - 1)[:, :, np.newaxis],
+        axis=1,
+    ).astype("float64")
+    aligned[~valid] = np.nan
+    return days, aligned
 
 
 def line_comparison_data(country):
-    whole_df = pd.DataFrame()
-    whole_df["dates"] = list(confirmed_global.columns[1:])
-    whole_df["confirmed"] = list(
-        confirmed_global.loc[confirmed_global["country"] == country].values.flatten()[
-            1:
-        ]
-    )
-    whole_df["deaths"] = list(
-        deaths_global.loc[deaths_global["country"] == country].values.flatten()[1:]
-    )
-    whole_df["recovered"] = list(
-        recovered_global.loc[recovered_global["country"] == country].values.flatten()[
-            1:
-        ]
-    )
+    dates, values = compare(country)
+    whole_df = pd.DataFrame(values[0], columns=snapshot.current().cube.metric_index)
+    whole_df.insert(0, "dates", dates)
     return whole_df
 
 
-def compare(df, *args):
-    l = list(args)
-    temp = unpivot(df)
-    temp = temp[temp["country"].isin(l)]
-    return temp
+def race_frames(countries, dates, top, counts):
+    names = np.asarray(countries, dtype=object)
+    return [
+        go.Frame(
+            data=[go.Bar(x=names[top[i]], y=counts[i])],
+            name=dates[i].strftime("%m/%d/%y"),
+        )
+        for i in range(len(dates))
+    ]
 
 
-def create_data(df):
-    new = take_top10(df)
-    l = list(set(new["variable"]))
-    l.sort()
-    l.reverse()
-    ff = new[new["variable"].isin(l[::5])]
-    ff.rename(
-        columns={"country": "Country", "variable": "Date", "value": "Cases"},
-        inplace=True,
+def plot_race(frames, Color, y_max, duration=50, y_title="Cases"):
+    play = dict(
+        frame=dict(duration=duration, redraw=True),
+        transition=dict(duration=0),
+        fromcurrent=True,
     )
-    return ff
-
-
-def plot_fig(ff, Color):
-    fig = px.bar(
-        ff,
-        x="Country",
-        y="Cases",
-        color_discrete_sequence=[Color] * len(ff),
+    fig = go.Figure(data=frames[0].data, frames=frames)
+    fig.update_traces(marker_color=Color)
+    fig.layout.update(
         template="plotly_dark",
-        animation_frame="Date",
-        animation_group="Country",
-        range_y=[0, ff["Cases"].max()],
+        showlegend=False,
+        xaxis_title="Country",
+        yaxis_title=y_title,
+        yaxis_range=[0, y_max],
+        updatemenus=[
+            dict(
+                type="buttons",
+                direction="left",
+                x=0.1,
+                y=0,
+                xanchor="right",
+                yanchor="top",
+                pad=dict(r=10, t=70),
+                showactive=False,
+                buttons=[
+                    dict(label="&#9654;", method="animate", args=[None, play]),
+                    dict(
+                        label="&#9724;",
+                        method="animate",
+                        args=[[None], dict(frame=dict(duration=0), mode="immediate")],
+                    ),
+                ],
+            )
+        ],
+        sliders=[
+            dict(
+                x=0.1,
+                y=0,
+                len=0.9,
+                xanchor="left",
+                yanchor="top",
+                pad=dict(b=10, t=50),
+                currentvalue=dict(prefix="Date="),
+                steps=[
+                    dict(
+                        label=frame.name,
+                        method="animate",
+                        args=[[frame.name], dict(play, mode="immediate")],
+                    )
+                    for frame in frames
+                ],
+            )
+        ],
     )
-    fig.layout.update(showlegend=False)
     return fig
 
 
-def animated_barchart(df, name):
+def animated_barchart(name, k=10, per100k=False):
     color = (
         "#f54842"
         if name == "deaths"
@@ -89,12 +128,22 @@ def animated_barchart(df, name):
         if name == "confirmed"
         else "#42f587"
     )
-    return plot_fig(create_data(take_top10(unpivot(df))), color)
+    # One frame per day, each with the leaders of that day
+    snap = snapshot.current()
+    cube = snap.cube
+    values = snap.normalized.per100k if per100k else None
+    top, counts = top_k(cube.metric(name, values), k)
+    frames = race_frames(cube.countries, cube.dates, top, counts)
+    y_title = "Cases per 100k people" if per100k else "Cases"
+    return plot_race(frames, color, counts.max(), y_title=y_title)
 
 
 """
 Examples:
-fig = animated_barchart(confirmed_global, "confirmed")
-fig = animated_barchart(deaths_global, "deaths")
-fig = animated_barchart(recovered_global, "recovered")
+fig = animated_barchart("confirmed")
+fig = animated_barchart("deaths", k=5)
+fig = animated_barchart("confirmed", per100k=True)
+top, counts = top_k(cube.metric("recovered"))
+dates, values = compare("India", "US", "Brazil")
+days, aligned = days_since(values, n=100, metric="deaths")
 """
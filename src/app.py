@@ -1,37 +1,57 @@
 # Imports and data preprocessing
 from dash import *
+from dash import no_update
 from dash_bootstrap_components._components.Col import Col
 import dash_bootstrap_components as dbc
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 from datetime import date
 import requests
 from datetime import timedelta
 import plotly.io as pio
 import os
+from flask import Response, abort, jsonify, request
 from flask_caching import Cache
 import app_vars as av
+import store
+import fetch
+import snapshot
+import cube
+import cache_backend
+import figure_json
+import clusters
+import geometry
 import time
 import datetime
 import pickle
 import json
+import logging
+import threading
+from functools import partial
 from fake_useragent import UserAgent
 
 pio.templates.default = "plotly_dark"
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s: %(message)s")
+
 external_stylesheets = [dbc.themes.CYBORG]
 
 temp_user_agent = UserAgent()
 header = {'User-Agent': temp_user_agent.random}
-district_list=[]
-dist_id=[]
-for code in range(1,40):
-    response = requests.get("https://cdn-api.co-vin.in/api/v2/admin/location/districts/{}".format(code), headers=header)
-    json_data = json.loads(response.text)
-    for i in json_data["districts"]:
-        district_list.append(i['district_name'])
-        dist_id.append(i['district_id'])
+
+
+def get_districts():
+    district_list=[]
+    dist_id=[]
+    for code in range(1,40):
+        response = requests.get("https://cdn-api.co-vin.in/api/v2/admin/location/districts/{}".format(code), headers=header)
+        json_data = json.loads(response.text)
+        for i in json_data["districts"]:
+            district_list.append(i['district_name'])
+            dist_id.append(i['district_id'])
+    return district_list, dist_id
 
 
 
@@ -43,173 +63,172 @@ app = Dash(
 
 server = app.server
 
+TIMEOUT = 3600
+
+# The cache lives on disk so every worker on the host shares it, and its size is bounded
 cache = Cache(
     server,
     config={
-        "CACHE_TYPE": "simple",
+        "CACHE_TYPE": "cache_backend.SizeBoundedFileSystemCache",
+        "CACHE_DIR": cache_backend.CACHE_DIR,
+        "CACHE_THRESHOLD": 1000,
+        "CACHE_MAX_BYTES": cache_backend.MAX_BYTES,
+        "CACHE_DEFAULT_TIMEOUT": TIMEOUT,
     },
 )
 
 
-TIMEOUT = 3600
-
-
-@cache.memoize(timeout=TIMEOUT)
-def collect_data():
-    filenames = [
-        "time_series_covid19_confirmed_global.csv",
-        "time_series_covid19_deaths_global.csv",
-        "time_series_covid19_recovered_global.csv",
-    ]
-    url = av.main_url
-    confirmed_global = pd.read_csv(url + filenames[0])
-
-    deaths_global = pd.read_csv(url + filenames[1])
-
-    recovered_global = pd.read_csv(url + filenames[2])
+def cases_object(array):
+    obj1 = {
+        study: sum([(i["stats"][study]) for i in array if i["stats"][study]])
+        for study in ["confirmed", "deaths", "recovered"]
+    }
+    return {**obj1, "updatedAt": [i["updatedAt"] for i in array]}
 
-    country_cases = pd.read_csv(
-        "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/web-data/data/cases_country.csv"
-    )
 
-    confirmed_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
+def choose_country(provinces, country):
+    # provinces is the snapshot's index of the v2/jhucsse records by country
+    return provinces.get(country, [])
 
-    deaths_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
 
-    recovered_global.drop(columns=["Province/State", "Lat", "Long"], inplace=True)
+def get_final_object(country, provinces):
+    return cases_object(choose_country(provinces, country))
 
 
-    country_cases.drop(
-        columns=[
-            "Last_Update",
-            "Incident_Rate",
-            "People_Tested",
-            "People_Hospitalized",
-            "UID",
-        ],
-        inplace=True,
-    )
+# Every upstream source is fetched at the same time, so startup waits on the slowest one
 
-    confirmed_global.rename(columns={"Country/Region": "country"}, inplace=True)
-    deaths_global.rename(columns={"Country/Region": "country"}, inplace=True)
-    recovered_global.rename(columns={"Country/Region": "country"}, inplace=True)
-
-    country_cases.rename(
-        columns={
-            "Country_Region": "country",
-            "Confirmed": "confirmed",
-            "Deaths": "deaths",
-            "Recovered": "recovered",
-            "Active": "active",
-            "Mortality_Rate": "mortality",
-        },
-        inplace=True,
-    )
+startup = fetch.run_concurrently(
+    {
+        "snapshot": lambda: snapshot.refresh(max_age=TIMEOUT),
+        "co-vin districts": get_districts,
+    }
+)
 
-    confirmed_global = confirmed_global.groupby(["country"], as_index=False).sum()
-    deaths_global = deaths_global.groupby(["country"], as_index=False).sum()
-    recovered_global = recovered_global.groupby(["country"], as_index=False).sum()
+district_list, dist_id = startup["co-vin districts"]
 
+# Later snapshots are built on a background thread and swapped in once complete
+snapshot.start_refresher(TIMEOUT)
 
-    country_cases_sorted = country_cases.sort_values("confirmed", ascending=False)
-    country_cases_sorted.index = [x for x in range(len(country_cases_sorted))]
+store.report_memory(
+    {
+        "confirmed_global": startup["snapshot"].confirmed_global,
+        "deaths_global": startup["snapshot"].deaths_global,
+        "recovered_global": startup["snapshot"].recovered_global,
+        "country_cases": startup["snapshot"].country_cases_sorted,
+        "cube": startup["snapshot"].cube.values,
+    }
+)
 
-    return (confirmed_global, deaths_global, recovered_global,country_cases_sorted)
+import animations
+import maps
+import country_visuals as cv
+import timeseries
 
+import cnn
 
-@cache.memoize(timeout=TIMEOUT)
-def get_today_data():
-    today_data = requests.get("https://corona.lmao.ninja/v2/all?yesterday")
-    today_country_data = requests.get("https://corona.lmao.ninja/v2/jhucsse")
+# Declaring the Variables Required for the Pages
 
-    today_data = today_data.json()
-    today_country_data = today_country_data.json()
+confirmed = dict(study="confirmed", color="#45a2ff")
+recovered = dict(study="recovered", color="#42f587")
+deaths = dict(study="deaths", color="#f54842")
 
-    return today_data, today_country_data
+columns = ["country", ["deaths", "confirmed", "recovered"], "Lat", "Long_"]
 
+country_list = startup["snapshot"].cube.countries
 
-def cases_object(array):
-    obj1 = {
-        study: sum([(i["stats"][study]) for i in array if i["stats"][study]])
-        for study in ["confirmed", "deaths", "recovered"]
-    }
-    return {**obj1, "updatedAt": [i["updatedAt"] for i in array]}
 
+def world_map(metric):
+    study = {"confirmed": confirmed, "recovered": recovered, "deaths": deaths}[metric]
+    return maps.plot_world(snapshot.current().country_cases_sorted, columns, study)
 
-def choose_country(array, country):
-    return [i for i in array if (i["country"] == country)]
 
+def world_timeseries(metric):
+    return timeseries.plot_world_timeseries(metric, n=-20, daily=True)
 
-def get_final_object(country, array):
-    return cases_object(choose_country(array, country))
 
+# The figures of the global page, in the order of the outputs of update_graphs
+global_builders = {
+    "map": world_map,
+    "race": animations.animated_barchart,
+    "timeseries": world_timeseries,
+}
 
-(
-    today_data,
-    today_country_data,
-) = get_today_data()
 
-(
-    av.confirmed_global,
-    av.deaths_global,
-    av.recovered_global,
-    av.country_cases,
-) = collect_data()
+# The snapshot's figures version is part of the key, so a refresh never serves stale
+# figures.
+# Figures are kept as serialized JSON, spilled to the cache shared by the workers
+def global_figure_json(metric, version):
+    spill = cache if figure_json.SPILL else None
+    return tuple(
+        figure_json.get(f"figure/{name}/{metric}/{version}", partial(build, metric), spill)
+        for name, build in global_builders.items()
+    )
 
-av.country_cases_sorted = av.country_cases
 
-(
-    confirmed_global,
-    deaths_global,
-    recovered_global,
-    country_cases,
-    country_cases_sorted,
-) = (
-    av.confirmed_global,
-    av.deaths_global,
-    av.recovered_global,
-    av.country_cases,
-    av.country_cases_sorted,
-)
+def global_figures(metric, version):
+    return tuple(json.loads(figure) for figure in global_figure_json(metric, version))
 
 
-# Importing these modules later as they rely on having data stored
+def province_map(country, study, zoom=maps.PROVINCE_ZOOM, box=None):
+    spill = cache if figure_json.SPILL else None
+    return maps.province_map(country, study, zoom, spill, box)
 
-import animations
-import maps
-import country_visuals as cv
-import timeseries
 
-import cnn
+# The country boundaries of the choropleth map, the same for every metric and
+# snapshot so browsers keep them for a day
+@server.route("/geometry/<resolution>.json")
+def country_boundaries(resolution):
+    if resolution not in geometry.RESOLUTIONS or geometry.load() is None:
+        abort(404)
+    return Response(
+        geometry.geojson(resolution),
+        mimetype="application/json",
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
 
-# Making the Graphs and Declaring the Variables Required for the Pages
 
-animations_figure = animations.animated_barchart(confirmed_global, "confirmed")
+@server.route("/stats/figure-cache")
+def figure_cache_stats():
+    return jsonify(figure_json.stats())
 
-confirmed = dict(study="confirmed", color="#45a2ff")
-recovered = dict(study="recovered", color="#42f587")
-deaths = dict(study="deaths", color="#f54842")
 
-columns = ["country", ["deaths", "confirmed", "recovered"], "Lat", "Long_"]
+# Aligned series of several countries for comparison views, such as
+# /api/compare?countries=India,US&since=100 for the days since the 100th case
+@server.route("/api/compare")
+def compare_countries():
+    countries = [c for c in request.args.get("countries", "").split(",") if c]
+    unknown = [c for c in countries if c not in snapshot.current().cube.index]
+    if not countries or unknown:
+        return jsonify(error="unknown countries", countries=unknown), 400
 
-world_map = maps.plot_study(country_cases_sorted, columns, confirmed)
+    dates, values = animations.compare(*countries)
+    since = request.args.get("since", type=int)
+    if since is None:
+        x = [d.strftime("%Y-%m-%d") for d in dates]
+    else:
+        x, values = animations.days_since(values, since)
+        x = x.tolist()
+        values = np.where(np.isnan(values), None, values)
+    return jsonify(
+        countries=countries,
+        metrics=store.METRICS,
+        x=x,
+        values=values.tolist(),
+    )
 
 
-confirmed_timeseries = timeseries.plot_world_timeseries(
-    confirmed_global, "confirmed", n=-20, daily=True
-)
+def warm_up(new_snapshot):
+    # Builds the global page for every metric, so the first visitor after a refresh does not wait
+    for metric in ["confirmed", "recovered", "deaths"]:
+        global_figure_json(metric, new_snapshot.figures_version)
 
-country_list = confirmed_global["country"]
 
-today = date.today()
+def start_warm_up(new_snapshot):
+    threading.Thread(target=warm_up, args=(new_snapshot,), daemon=True).start()
 
-world_timeseries_confirmed = timeseries.get_world_timeseries(confirmed_global)
-world_timeseries_deaths = timeseries.get_world_timeseries(deaths_global)
-world_timeseries_recovered = timeseries.get_world_timeseries(recovered_global)
 
-confirmed_global_cases_today = format(today_data["cases"], ",d")
-confirmed_recovered_cases_today = format(today_data["recovered"], ",d")
-confirmed_deaths_cases_today = format(today_data["deaths"], ",d")
+snapshot.on_swap(start_warm_up)
+start_warm_up(startup["snapshot"])
 
 # Making the Individual Pages
 
@@ -751,6 +770,10 @@ global_page = html.Div(
 
 country_page = html.Div(
     children=[
+        # The study shown on the province map, for the clusters served on zoom
+        dcc.Store(id="country-study", data="Confirmed"),
+        # The zoom level and padded bounds of the province markers last sent
+        dcc.Store(id="country-map-view"),
         dbc.Row(
             dbc.Col(
                 dcc.Dropdown(
@@ -935,6 +958,45 @@ country_page = html.Div(
                             },
                             className="mt-3 p-3",
                         ),
+                        html.Div(
+                            [
+                                dbc.Row(html.H4("Growth Rate"), className="ml-3 mt-2"),
+                                dbc.Row(
+                                    html.H5(id="growth-country"), className="ml-3 mb-2"
+                                ),
+                            ],
+                            style={
+                                "borderRadius": "30px",
+                                "backgroundColor": "#8634eb",
+                            },
+                            className="mt-3 p-3",
+                        ),
+                        html.Div(
+                            [
+                                dbc.Row(html.H4("Doubling Time"), className="ml-3 mt-2"),
+                                dbc.Row(
+                                    html.H5(id="doubling-country"), className="ml-3 mb-2"
+                                ),
+                            ],
+                            style={
+                                "borderRadius": "30px",
+                                "backgroundColor": "#8634eb",
+                            },
+                            className="mt-3 p-3",
+                        ),
+                        html.Div(
+                            [
+                                dbc.Row(html.H4("Reproduction Number (Rt)"), className="ml-3 mt-2"),
+                                dbc.Row(
+                                    html.H5(id="rt-country"), className="ml-3 mb-2"
+                                ),
+                            ],
+                            style={
+                                "borderRadius": "30px",
+                                "backgroundColor": "#8634eb",
+                            },
+                            className="mt-3 p-3",
+                        ),
                     ],
                     className="align-items-center",
                     sm=12,
@@ -1388,6 +1450,7 @@ app.layout = html.Div(
 )
 def update_message(btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
+    today_data = snapshot.current().today_data
     time_updated = datetime.datetime.fromtimestamp(
         today_data["updated"] / 1000
     ).strftime("%H:%M")
@@ -1435,42 +1498,18 @@ def update_message(btn1, btn2, btn3):
     dependencies.Input("recoveries", "n_clicks"),
     dependencies.Input("deaths", "n_clicks"),
 )
-@cache.memoize(timeout=TIMEOUT)
 def update_graphs(btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
+    version = snapshot.current().figures_version
 
     if "confirmed" in changed_id:
-        return (
-            maps.plot_study(country_cases_sorted, columns, confirmed),
-            animations.animated_barchart(df=confirmed_global, name="confirmed"),
-            timeseries.plot_world_timeseries(
-                confirmed_global, "confirmed", n=-20, daily=True
-            ),
-        )
+        return global_figures("confirmed", version)
     elif "recoveries" in changed_id:
-        return (
-            maps.plot_study(country_cases_sorted, columns, recovered),
-            animations.animated_barchart(df=recovered_global, name="recovered"),
-            timeseries.plot_world_timeseries(
-                recovered_global, "recovered", n=-20, daily=True
-            ),
-        )
+        return global_figures("recovered", version)
     elif "deaths" in changed_id:
-        return (
-            maps.plot_study(country_cases_sorted, columns, deaths),
-            animations.animated_barchart(df=deaths_global, name="deaths"),
-            timeseries.plot_world_timeseries(
-                deaths_global, "deaths", n=-20, daily=True
-            ),
-        )
+        return global_figures("deaths", version)
     else:
-        return (
-            maps.plot_study(country_cases_sorted, columns, confirmed),
-            animations.animated_barchart(df=confirmed_global, name="confirmed"),
-            timeseries.plot_world_timeseries(
-                confirmed_global, "confirmed", n=-20, daily=True
-            ),
-        )
+        return global_figures("confirmed", version)
 
 
 # Updates the text and stats on the page
@@ -1484,69 +1523,34 @@ def update_graphs(btn1, btn2, btn3):
     dependencies.Input("recoveries", "n_clicks"),
     dependencies.Input("deaths", "n_clicks"),
 )
-@cache.memoize(timeout=TIMEOUT)
 def update_cases(btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
+    snap = snapshot.current()
+    today_data = snap.today_data
 
+    today = date.today()
     lastweek = today - timedelta(weeks=1)
     lastmonth = today - timedelta(days=30)
 
-    if "confirmed" in changed_id:
-        lastweek_cases = world_timeseries_confirmed.at[
-            lastweek.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        lastmonth_cases = world_timeseries_confirmed.at[
-            lastmonth.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        return (
-            confirmed_global_cases_today,
-            format(lastweek_cases, ",d"),
-            "+" + format(today_data["cases"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(today_data["cases"] - lastmonth_cases, ",d"),
-        )
-    elif "recoveries" in changed_id:
-        lastweek_cases = world_timeseries_recovered.at[
-            lastweek.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        lastmonth_cases = world_timeseries_recovered.at[
-            lastmonth.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        return (
-            confirmed_recovered_cases_today,
-            format(lastweek_cases, ",d"),
-            "+" + format(today_data["recovered"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(today_data["recovered"] - lastmonth_cases, ",d"),
-        )
+    if "recoveries" in changed_id:
+        metric, today_cases = "recovered", today_data["recovered"]
     elif "deaths" in changed_id:
-        lastweek_cases = world_timeseries_deaths.at[
-            lastweek.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        lastmonth_cases = world_timeseries_deaths.at[
-            lastmonth.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        return (
-            confirmed_deaths_cases_today,
-            format(lastweek_cases, ",d"),
-            "+" + format(today_data["deaths"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(today_data["deaths"] - lastmonth_cases, ",d"),
-        )
+        metric, today_cases = "deaths", today_data["deaths"]
     else:
-        lastweek_cases = world_timeseries_confirmed.at[
-            lastweek.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        lastmonth_cases = world_timeseries_confirmed.at[
-            lastmonth.strftime("%-m/%-d/%y"), "Cases"
-        ]
-        return (
-            confirmed_global_cases_today,
-            format(lastweek_cases, ",d"),
-            "+" + format(today_data["cases"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(today_data["cases"] - lastmonth_cases, ",d"),
-        )
+        metric, today_cases = "confirmed", today_data["cases"]
+
+    # Both lookups are one binary search over the dates of the world totals
+    world = snap.world[metric]
+    lastweek_cases, lastmonth_cases = world.values[
+        cube.positions(world.index, [lastweek, lastmonth])
+    ]
+    return (
+        format(today_cases, ",d"),
+        format(lastweek_cases, ",d"),
+        "+" + format(today_cases - lastweek_cases, ",d"),
+        format(lastmonth_cases, ",d"),
+        "+" + format(today_cases - lastmonth_cases, ",d"),
+    )
 
 
 # Callbacks for the Country Analysis Page
@@ -1561,7 +1565,7 @@ def update_cases(btn1, btn2, btn3):
 )
 def update_country_message(value, btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
-    country_stats = get_final_object(value, today_country_data)
+    country_stats = get_final_object(value, snapshot.current().provinces)
     date_obj = datetime.datetime.strptime(
         country_stats["updatedAt"][0], "%Y-%m-%d %H:%M:%S"
     )
@@ -1605,22 +1609,80 @@ def update_country_message(value, btn1, btn2, btn3):
         )
 
 
+@callback(
+    dependencies.Output("country-study", "data"),
+    dependencies.Input("country-dropdown", "value"),
+    dependencies.Input("confirmed-country", "n_clicks"),
+    dependencies.Input("recoveries-country", "n_clicks"),
+    dependencies.Input("deaths-country", "n_clicks"),
+)
+def update_country_study(value, btn1, btn2, btn3):
+    changed_id = [p["prop_id"] for p in callback_context.triggered][0]
+    if "recoveries-country" in changed_id:
+        return "Recoveries"
+    elif "deaths-country" in changed_id:
+        return "Deaths"
+    else:
+        return "Confirmed"
+
+
 # Updates the graphs shown on the page for the country chosen in the dropdown
 @callback(
     dependencies.Output("metric-output-country", "figure"),
     dependencies.Output("timeseries-output-country", "figure"),
+    dependencies.Output("country-map-view", "data"),
     dependencies.Input("country-dropdown", "value"),
     dependencies.Input("confirmed-country", "n_clicks"),
     dependencies.Input("recoveries-country", "n_clicks"),
     dependencies.Input("deaths-country", "n_clicks"),
+    dependencies.Input("metric-output-country", "relayoutData"),
+    dependencies.State("country-study", "data"),
+    dependencies.State("country-map-view", "data"),
 )
-def update_graphs_country(value, btn1, btn2, btn3):
+@figure_json.typed_figures
+def update_graphs_country(value, btn1, btn2, btn3, relayout, study, view):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
 
+    if "relayoutData" in changed_id:
+        return update_province_view(value, study, relayout, view)
+    # A new country or study opens on the whole country at PROVINCE_ZOOM
+    whole = {"level": clusters.level(maps.PROVINCE_ZOOM), "bounds": None}
+    return country_graphs(value, changed_id) + (whole,)
+
+
+def update_province_view(country, study, relayout, view):
+    # Zooming or panning the province map only sends the clusters of the new view,
+    # and nothing while the view stays within the level and bounds last sent
+    if not relayout or "mapbox.zoom" not in relayout:
+        return no_update, no_update, no_update
+    level = clusters.level(relayout["mapbox.zoom"])
+    corners = relayout.get("mapbox._derived", {}).get("coordinates")
+    if view and view["level"] == level:
+        # The whole country only covers every view if none of its clusters were capped
+        if view["bounds"] is None:
+            covered = maps.fits(country, study, relayout["mapbox.zoom"])
+        else:
+            covered = corners and clusters.covers(
+                view["bounds"], clusters.bounds(corners)
+            )
+        if covered:
+            return no_update, no_update, no_update
+
+    box = clusters.bounds(corners, clusters.VIEW_MARGIN) if corners else None
+    try:
+        figure = province_map(country, study, relayout["mapbox.zoom"], box)
+    except:
+        return no_update, no_update, no_update
+    return figure, no_update, {"level": level, "bounds": box}
+
+
+def country_graphs(value, changed_id):
+    snap = snapshot.current()
+
     if "confirmed-country" in changed_id:
         try:
             return (
-                maps.plot_country(value, today_country_data, "Confirmed"),
+                province_map(value, "Confirmed"),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_cases,
@@ -1631,7 +1693,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
             )
         except:
             return (
-                maps.plot_study(country_cases_sorted, columns, confirmed, value),
+                maps.plot_study(snap.country_cases_sorted, columns, confirmed, value),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_cases,
@@ -1643,7 +1705,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
     elif "recoveries-country" in changed_id:
         try:
             return (
-                maps.plot_country(value, today_country_data, "Recoveries"),
+                province_map(value, "Recoveries"),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_recoveries,
@@ -1654,7 +1716,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
             )
         except:
             return (
-                maps.plot_study(country_cases_sorted, columns, recovered, value),
+                maps.plot_study(snap.country_cases_sorted, columns, recovered, value),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_recoveries,
@@ -1666,7 +1728,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
     elif "deaths-country" in changed_id:
         try:
             return (
-                maps.plot_country(value, today_country_data, "Deaths"),
+                province_map(value, "Deaths"),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_deaths,
@@ -1677,7 +1739,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
             )
         except:
             return (
-                maps.plot_study(country_cases_sorted, columns, deaths, value),
+                maps.plot_study(snap.country_cases_sorted, columns, deaths, value),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_deaths,
@@ -1689,7 +1751,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
     else:
         try:
             return (
-                maps.plot_country(value, today_country_data, "Confirmed"),
+                province_map(value, "Confirmed"),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_cases,
@@ -1700,7 +1762,7 @@ def update_graphs_country(value, btn1, btn2, btn3):
             )
         except:
             return (
-                maps.plot_study(country_cases_sorted, columns, confirmed, value),
+                maps.plot_study(snap.country_cases_sorted, columns, confirmed, value),
                 timeseries.plot_timeseries(
                     value,
                     timeseries.get_new_cases,
@@ -1726,73 +1788,63 @@ def update_graphs_country(value, btn1, btn2, btn3):
 def update_cases_country(value, btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
 
-    country_stats = get_final_object(value, today_country_data)
+    country_stats = get_final_object(value, snapshot.current().provinces)
     cases = format(country_stats["confirmed"], ",d")
     recovered = format(country_stats["recovered"], ",d")
     deaths = format(country_stats["deaths"], ",d")
 
-    country_time_series = animations.line_comparison_data(value)
-    country_time_series.index = country_time_series["dates"]
-
+    today = date.today()
     lastweek = today - timedelta(weeks=1)
     lastmonth = today - timedelta(days=30)
 
-    if "confirmed-country" in changed_id:
-        lastweek_cases = country_time_series.at[
-            lastweek.strftime("%-m/%-d/%y"), "confirmed"
-        ]
-        lastmonth_cases = country_time_series.at[
-            lastmonth.strftime("%-m/%-d/%y"), "confirmed"
-        ]
-        return (
-            cases,
-            format(lastweek_cases, ",d"),
-            "+" + format(country_stats["confirmed"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(country_stats["confirmed"] - lastmonth_cases, ",d"),
-        )
-    elif "recoveries-country" in changed_id:
-        lastweek_cases = country_time_series.at[
-            lastweek.strftime("%-m/%-d/%y"), "recovered"
-        ]
-        lastmonth_cases = country_time_series.at[
-            lastmonth.strftime("%-m/%-d/%y"), "recovered"
-        ]
-        return (
-            recovered,
-            format(lastweek_cases, ",d"),
-            "+" + format(country_stats["recovered"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(country_stats["recovered"] - lastmonth_cases, ",d"),
-        )
+    if "recoveries-country" in changed_id:
+        metric, today_cases = "recovered", recovered
     elif "deaths-country" in changed_id:
-        lastweek_cases = country_time_series.at[
-            lastweek.strftime("%-m/%-d/%y"), "deaths"
-        ]
-        lastmonth_cases = country_time_series.at[
-            lastmonth.strftime("%-m/%-d/%y"), "deaths"
-        ]
-        return (
-            deaths,
-            format(lastweek_cases, ",d"),
-            "+" + format(country_stats["deaths"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(country_stats["deaths"] - lastmonth_cases, ",d"),
-        )
+        metric, today_cases = "deaths", deaths
     else:
-        lastweek_cases = country_time_series.at[
-            lastweek.strftime("%-m/%-d/%y"), "confirmed"
-        ]
-        lastmonth_cases = country_time_series.at[
-            lastmonth.strftime("%-m/%-d/%y"), "confirmed"
-        ]
-        return (
-            cases,
-            format(lastweek_cases, ",d"),
-            "+" + format(country_stats["confirmed"] - lastweek_cases, ",d"),
-            format(lastmonth_cases, ",d"),
-            "+" + format(country_stats["confirmed"] - lastmonth_cases, ",d"),
-        )
+        metric, today_cases = "confirmed", cases
+
+    lastweek_cases, lastmonth_cases = snapshot.current().cube.asof(
+        metric, value, [lastweek, lastmonth]
+    )
+    return (
+        today_cases,
+        format(lastweek_cases, ",d"),
+        "+" + format(country_stats[metric] - lastweek_cases, ",d"),
+        format(lastmonth_cases, ",d"),
+        "+" + format(country_stats[metric] - lastmonth_cases, ",d"),
+    )
+
+
+# Shows the latest growth rate, doubling time and Rt, precomputed with the snapshot
+@callback(
+    dependencies.Output("growth-country", "children"),
+    dependencies.Output("doubling-country", "children"),
+    dependencies.Output("rt-country", "children"),
+    dependencies.Input("country-dropdown", "value"),
+    dependencies.Input("confirmed-country", "n_clicks"),
+    dependencies.Input("recoveries-country", "n_clicks"),
+    dependencies.Input("deaths-country", "n_clicks"),
+)
+def update_indicators(value, btn1, btn2, btn3):
+    changed_id = [p["prop_id"] for p in callback_context.triggered][0]
+    snap = snapshot.current()
+
+    if "recoveries-country" in changed_id:
+        metric = "recovered"
+    elif "deaths-country" in changed_id:
+        metric = "deaths"
+    else:
+        metric = "confirmed"
+
+    growth_rate, doubling_time, rt = (
+        snap.cube.series(metric, value, values)[-1] for values in snap.indicators
+    )
+    return (
+        "-" if np.isnan(growth_rate) else f"{growth_rate:+.1%} per day",
+        "-" if np.isnan(doubling_time) else f"{doubling_time:,.0f} days",
+        "-" if np.isnan(rt) else f"{rt:.2f}",
+    )
 
 
 @callback(
@@ -1806,7 +1858,7 @@ def update_cases_country(value, btn1, btn2, btn3):
 def update_stats(value, btn1, btn2, btn3):
     changed_id = [p["prop_id"] for p in callback_context.triggered][0]
     country_stats = maps.get_country_frame(
-        maps.choose_country(today_country_data, value)
+        maps.choose_country(snapshot.current().provinces, value)
     )
 
     try:
@@ -2012,7 +2064,7 @@ def forecast_cases(btn1, btn2, btn3, value):
             with open("temp.pkl", "rb") as fh:
                 data = pickle.load(fh)
                 return (
-                    dcc.Graph(figure=data["fig"]),
+                    dcc.Graph(figure=figure_json.typed(data["fig"])),
                     dbc.Table.from_dataframe(
                         data["predictions"], striped=True, bordered=True, hover=True
                     ),
@@ -2021,7 +2073,7 @@ def forecast_cases(btn1, btn2, btn3, value):
         except:
             preds, _, fig = cnn.cnn_predict("confirmed", value)
             return (
-                dcc.Graph(figure=fig),
+                dcc.Graph(figure=figure_json.typed(fig)),
                 dbc.Table.from_dataframe(
                     preds, striped=True, bordered=True, hover=True
                 ),
@@ -2036,7 +2088,7 @@ def forecast_cases(btn1, btn2, btn3, value):
             with open("temp.pkl", "rb") as fh:
                 data = pickle.load(fh)
                 return (
-                    dcc.Graph(figure=data["fig"]),
+                    dcc.Graph(figure=figure_json.typed(data["fig"])),
                     dbc.Table.from_dataframe(
                         data["predictions"], striped=True, bordered=True, hover=True
                     ),
@@ -2045,7 +2097,7 @@ def forecast_cases(btn1, btn2, btn3, value):
         except:
             preds, _, fig = cnn.cnn_predict("recovered", value)
             return (
-                dcc.Graph(figure=fig),
+                dcc.Graph(figure=figure_json.typed(fig)),
                 dbc.Table.from_dataframe(
                     preds, striped=True, bordered=True, hover=True
                 ),
@@ -2060,7 +2112,7 @@ def forecast_cases(btn1, btn2, btn3, value):
             with open("temp.pkl", "rb") as fh:
                 data = pickle.load(fh)
                 return (
-                    dcc.Graph(figure=data["fig"]),
+                    dcc.Graph(figure=figure_json.typed(data["fig"])),
                     dbc.Table.from_dataframe(
                         data["predictions"], striped=True, bordered=True, hover=True
                     ),
@@ -2074,7 +2126,7 @@ def forecast_cases(btn1, btn2, btn3, value):
 
 
             return (
-                dcc.Graph(figure=fig),
+                dcc.Graph(figure=figure_json.typed(fig)),
                 dbc.Table.from_dataframe(
                     preds, striped=True, bordered=True, hover=True
                 ),
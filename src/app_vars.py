@@ -1,12 +1,8 @@
 
-confirmed_global, deaths_global, recovered_global, country_cases, country_cases_sorted = (
-    None,
-    None,
-    None,
-    None,
-    None
-)
 main_url='https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/'
+cases_country_url="https://raw.githubusercontent.com/CSSEGISandData/COVID-19/web-data/data/cases_country.csv"
+today_url="https://corona.lmao.ninja/v2/all?yesterday"
+jhucsse_url="https://corona.lmao.ninja/v2/jhucsse"
 img1="https://fourremovalsolutions.sg/wp-content/uploads/2020/04/Four-Solutions-Disinfecting-Spraying-01.png"
 img2="https://image.freepik.com/free-vector/coronavirus-symptoms-concept_23-2148496136.jpg"
 covid_19 = """
@@ -0,0 +1,159 @@
+# Imports
+import sys
+import json
+import time
+from itertools import chain
+import numpy as np
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+import snapshot
+import figure_json
+import maps
+import animations
+import timeseries
+
+# Run from src with `python benchmarks.py [country]`, this is a measurement script
+# and not part of the app. Every section prints its own table. convert_df_speed
+# needs no data, figure_payloads refreshes the snapshot first.
+
+confirmed = dict(study="confirmed", color="#45a2ff")
+
+columns = ["country", ["deaths", "confirmed", "recovered"], "Lat", "Long_"]
+
+
+def page_figures(country):
+    # The figures each page sends, built the way the callbacks build them
+    snap = snapshot.current()
+    pages = {
+        "global": {
+            "map": lambda: maps.plot_study(snap.country_cases_sorted, columns, confirmed),
+            "race": lambda: animations.animated_barchart("confirmed"),
+            "timeseries": lambda: timeseries.plot_world_timeseries(
+                "confirmed", n=-20, daily=True
+            ),
+        },
+        "country": {
+            "map": lambda: maps.province_map(country, "Confirmed"),
+            "timeseries": lambda: timeseries.plot_timeseries(
+                country, timeseries.get_new_cases, "Confirmed Cases", n=0, daily=True
+            ),
+        },
+        "forecast": {"naive forecast": lambda: naive_forecast(country)},
+    }
+    return pages
+
+
+def naive_forecast(country):
+    # cnn pulls in tensorflow, so it is only imported when the forecast page is measured
+    import cnn
+
+    return cnn.naive_forecast("confirmed", country)[1]
+
+
+def payload_sizes(fig):
+    # Bytes of the figure with JSON numbers and with typed arrays
+    plain = json.dumps(figure_json.decode(fig), cls=PlotlyJSONEncoder)
+    typed = json.dumps(figure_json.encode(fig), cls=PlotlyJSONEncoder)
+    return len(plain), len(typed)
+
+
+def figure_payloads(country="India"):
+    print(f"{'page':<10}{'figure':<16}{'json kB':>10}{'typed kB':>10}{'saved':>8}")
+    for page, figures in page_figures(country).items():
+        for name, build in figures.items():
+            try:
+                plain, typed = payload_sizes(build())
+            except Exception as e:
+                print(f"{page:<10}{name:<16}  failed: {e!r}")
+                continue
+            print(
+                f"{page:<10}{name:<16}{plain / 1024:>10.1f}{typed / 1024:>10.1f}"
+                f"{1 - typed / plain:>8.0%}"
+            )
+
+
+def convert_df_loop(df, cols):
+    # maps.convert_df as it was before it was vectorized, kept to measure against
+    df.dropna(inplace=False)
+    df.set_index(df[cols[0]].values)
+    L = []
+    for i in range(len(df)):
+        string = ""
+        for j in range(len(cols[1])):
+            if j != (len(cols[1]) - 1):
+                string = string + str(df[cols[1][j]].values[i]) + ","
+            else:
+                string = string + str(df[cols[1][j]].values[i])
+
+        L.append(string)
+
+    df["New"] = L
+
+    lens = df["New"].astype(str).str.split(",").map(len)
+
+    df = pd.DataFrame(
+        {
+            "Country": np.repeat(df[cols[0]], lens),
+            "Lat": np.repeat(df[cols[-2]], lens),
+            "Long_": np.repeat(df[cols[-1]], lens),
+            "Count": list(
+                chain.from_iterable(df["New"].astype(str).str.split(","))
+            ),
+        }
+    )
+    df["Study"] = [cols[1][i] for i in range(len(cols[1]))] * (
+        len(df.index) // len(cols[1])
+    )
+
+    return df
+
+
+def places(n, seed=0):
+    # A frame shaped like country_cases_sorted with n places
+    rng = np.random.default_rng(seed)
+    confirmed = rng.integers(0, 10 ** 7, n)
+    return pd.DataFrame(
+        {
+            "country": pd.Series([f"Place {i}" for i in range(n)], dtype=object),
+            "confirmed": confirmed,
+            "deaths": confirmed // 50,
+            "recovered": confirmed // 2,
+            "Lat": rng.uniform(-60, 70, n),
+            "Long_": rng.uniform(-180, 180, n),
+        }
+    )
+
+
+def best_of(function, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def convert_df_speed():
+    print(f"{'places':<10}{'loop ms':>10}{'melt ms':>10}{'speedup':>10}")
+    for n in [200, 5000]:
+        df = places(n)
+        loop = best_of(lambda: convert_df_loop(df.copy(), columns))
+        melt = best_of(lambda: maps.convert_df(df, columns))
+        # Both give the same rows, the loop only has the counts as strings
+        old, new = convert_df_loop(df.copy(), columns), maps.convert_df(df, columns)
+        assert (old["Count"].astype("int64").values == new["Count"].values).all()
+        assert (old["Study"].values == new["Study"].values).all()
+        print(f"{n:<10}{loop * 1000:>10.1f}{melt * 1000:>10.1f}{loop / melt:>9.0f}x")
+
+
+if __name__ == "__main__":
+    convert_df_speed()
+    snapshot.refresh()
+    figure_payloads(*sys.argv[1:])
+
+
+"""
+Examples:
+python benchmarks.py
+python benchmarks.py US
+"""
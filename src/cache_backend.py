@@ -0,0 +1,66 @@
+# Imports
+import os
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+# A Flask-Caching backend every gunicorn worker on the host shares through the
+# file system. On top of the item count threshold of FileSystemCache it keeps
+# the total size of the cache under max_bytes by removing the least recently
+# used entries first.
+
+CACHE_DIR = os.getenv(
+    "COVIDASH_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "figure_cache"),
+)
+
+MAX_BYTES = int(os.getenv("COVIDASH_CACHE_MAX_BYTES", str(256 * 2 ** 20)))
+
+
+class SizeBoundedFileSystemCache(FileSystemCache):
+    def __init__(self, cache_dir, max_bytes=MAX_BYTES, **kwargs):
+        super().__init__(cache_dir, **kwargs)
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs["max_bytes"] = config.get("CACHE_MAX_BYTES", MAX_BYTES)
+        return super().factory(app, config, args, kwargs)
+
+    def get(self, key):
+        value = super().get(key)
+        if value is not None and key != self._fs_count_file:
+            # The modification time doubles as the last access time for the LRU order
+            try:
+                os.utime(self._get_filename(key))
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value, timeout=None, mgmt_element=False):
+        result = super().set(key, value, timeout, mgmt_element)
+        if result and not mgmt_element:
+            self.prune_to_size()
+        return result
+
+    def prune_to_size(self):
+        entries = []
+        for path in self._list_dir():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Another worker removed it first
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            self._update_count(delta=-removed)
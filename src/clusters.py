@@ -0,0 +1,128 @@
+# Imports
+import numpy as np
+import pandas as pd
+
+# Grid clustering of map points. At every zoom level the map is cut into square
+# cells of CELL_PIXELS on screen, and all the points of a cell become one marker
+# at their count weighted centre holding their total. The clusters are then
+# cropped to the part of the map around the view, and only the MAX_MARKERS
+# largest are drawn, so a figure stays small however many places a country has.
+
+# Width of the whole world at zoom 0 on a mapbox map, in pixels
+WORLD_PIXELS = 512
+
+CELL_PIXELS = 60
+
+# From this zoom on, every place is drawn on its own
+MAX_LEVEL = 12
+
+MAX_MARKERS = 300
+
+# The view is padded by this share of its size on every side before cropping, so
+# small pans stay within the markers already sent
+VIEW_MARGIN = 0.5
+
+
+def level(zoom):
+    return int(np.clip(np.floor(zoom), 0, MAX_LEVEL))
+
+
+def cell_size(level):
+    # In degrees of longitude, cells are as many degrees high, which is close
+    # enough away from the poles
+    return 360 * CELL_PIXELS / (WORLD_PIXELS * 2 ** level)
+
+
+def cluster(df, level):
+    # df is the long frame of one study (Country, Lat, Long_, Count, Study), the
+    # clusters come back in the same layout so create_data draws them as is
+    df = df.assign(
+        Lat=pd.to_numeric(df["Lat"], errors="coerce"),
+        Long_=pd.to_numeric(df["Long_"], errors="coerce"),
+        Count=pd.to_numeric(df["Count"], errors="coerce"),
+    ).dropna()
+    if df.empty or level >= MAX_LEVEL:
+        return df
+
+    lat, lon = df["Lat"].values, df["Long_"].values
+    counts, names = df["Count"].values.astype("float64"), df["Country"].values
+    size = cell_size(level)
+    cells = np.stack([np.floor(lat / size), np.floor(lon / size)], axis=-1)
+    _, group = np.unique(cells, axis=0, return_inverse=True)
+    group = group.reshape(-1)
+
+    places = np.bincount(group)
+    total = np.bincount(group, weights=counts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Cells without any count sit at the plain centre of their places
+        c_lat = np.where(
+            total > 0,
+            np.bincount(group, weights=lat * counts) / total,
+            np.bincount(group, weights=lat) / places,
+        )
+        c_lon = np.where(
+            total > 0,
+            np.bincount(group, weights=lon * counts) / total,
+            np.bincount(group, weights=lon) / places,
+        )
+
+    # Every cluster is named after its largest place
+    order = np.lexsort((-counts, group))
+    largest = order[np.r_[True, group[order][1:] != group[order][:-1]]]
+    labels = [
+        name if n == 1 else f"{name} +{n - 1} more"
+        for name, n in zip(names[largest], places)
+    ]
+    return pd.DataFrame(
+        {
+            "Country": labels,
+            "Lat": c_lat,
+            "Long_": c_lon,
+            "Count": total.astype("int64"),
+            "Study": df["Study"].values[0],
+        }
+    )
+
+
+def bounds(coordinates, margin=0):
+    # (west, south, east, north) of the [lon, lat] corners plotly reports as
+    # relayoutData["mapbox._derived"]["coordinates"], padded by margin
+    lon, lat = np.asarray(coordinates, dtype="float64").T
+    west, east, south, north = lon.min(), lon.max(), lat.min(), lat.max()
+    pad_lon, pad_lat = (east - west) * margin, (north - south) * margin
+    return [west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat]
+
+
+def covers(outer, inner):
+    return (
+        outer[0] <= inner[0]
+        and outer[1] <= inner[1]
+        and outer[2] >= inner[2]
+        and outer[3] >= inner[3]
+    )
+
+
+def view(df, box=None, n=MAX_MARKERS):
+    # The n largest clusters inside box, all of the country's when box is None
+    if box is not None:
+        west, south, east, north = box
+        df = df[
+            df["Long_"].between(west, east) & df["Lat"].between(south, north)
+        ]
+    if len(df) > n:
+        df = df.nlargest(n, "Count")
+    return df
+
+
+def levels(df):
+    # The clusters of every zoom level, computed once per country and study
+    return {n: cluster(df, n) for n in range(MAX_LEVEL + 1)}
+
+
+"""
+Examples:
+by_level = clusters.levels(long_df[long_df["Study"] == "Confirmed"])
+points = by_level[clusters.level(relayout["mapbox.zoom"])]
+box = clusters.bounds(relayout["mapbox._derived"]["coordinates"], clusters.VIEW_MARGIN)
+points = clusters.view(points, box)
+"""
@@ -8,50 +8,30 @@ from TSErrors import FindErrors
 from sklearn.model_selection import ParameterGrid
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Conv1D, MaxPooling1D, Dense, Flatten
-import app
-
-confirmed_global, deaths_global, recovered_global, country_cases_sorted = app.collect_data()
-def get_data(
-    confirmed=confirmed_global, deaths=deaths_global, recovered=recovered_global
-):
-
-    recovered = recovered.groupby("country").sum().T
-    deaths = deaths.groupby("country").sum().T
-    confirmed = confirmed.groupby("country").sum().T
-
-    deaths.index = pd.to_datetime(deaths.index, infer_datetime_format=True)
-    recovered.index = pd.to_datetime(recovered.index, infer_datetime_format=True)
-    confirmed.index = pd.to_datetime(confirmed.index, infer_datetime_format=True)
-
-    return deaths,recovered, confirmed
+import ingest
+import downsample
 
 
 def create_data_frame(dataframe, country):
 
-    deaths, recovered,  confirmed = get_data()
-
-    if dataframe == "deaths":
-        data = pd.DataFrame(
-            index=deaths.index, data=deaths[country].values, columns=["Total"]
-        )
-
-    elif dataframe == "recovered":
-        data = pd.DataFrame(
-            index=recovered.index, data=recovered[country].values, columns=["Total"]
-        )
-
-    elif dataframe == "confirmed":
-        data = pd.DataFrame(
-            index=confirmed.index, data=confirmed[country].values, columns=["Total"]
-        )
+    cube = ingest.get_cube()
+    daily = ingest.get_derived()[0].daily
 
-    data = data[(data != 0).all(1)]
+    data = pd.DataFrame(
+        index=cube.dates, data=cube.series(dataframe, country), columns=["Total"]
+    )
+    data_diff = pd.DataFrame(
+        index=cube.dates,
+        data=cube.series(dataframe, country, daily).astype("float64"),
+        columns=["Total"],
+    )
 
-    data_diff = data.diff()
+    nonzero = (data != 0).all(1)
+    data = data[nonzero]
 
     # Removing the first value from data_diff 
-    # It had no previous value and is a NaN after taking the difference
-    data_diff = data_diff[1:]
+    # It had no previous value to take the difference with
+    data_diff = data_diff[nonzero][1:]
 
     return data, data_diff
 
@@ -213,9 +193,11 @@ def plot_graph(data, pred):
 
     datelist = pd.date_range(data.index[-1], periods=15).tolist()
     datelist = datelist[1:]
+    # The last day is where the predictions start, so it is always drawn
+    history = downsample.frame(data, "Total", keep=[len(data) - 1])
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(x=data.index, y=data["Total"], mode="lines", name="Up till now")
+        go.Scatter(x=history.index, y=history["Total"], mode="lines", name="Up till now")
     )
     fig.add_trace(go.Scatter(x=datelist, y=pred, mode="lines", name="Predictions*"))
     fig.update_layout(template="plotly_dark")
@@ -232,9 +214,10 @@ def naive_forecast(study, country):
     df, _ = create_data_frame(study, country)
     datelist = pd.date_range(df.index[-1], periods=15).tolist()[1:]
     predictions = [df.Total[-1]] * 14
+    history = downsample.frame(df, "Total", keep=[len(df) - 1])
     fig = go.Figure()
     fig.add_trace(
-        go.Scatter(x=df.index, y=df["Total"], mode="lines", name="Up till now")
+        go.Scatter(x=history.index, y=history["Total"], mode="lines", name="Up till now")
     )
     fig.add_trace(
         go.Scatter(x=datelist, y=predictions, mode="lines", name="Predictions*")
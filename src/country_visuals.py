@@ -1,17 +1,15 @@
 # Imports
 import pandas as pd
 import numpy as np
-import requests
+import app_vars as av
+import fetch
 import plotly.express as px
 import plotly.graph_objects as go
 
 
 def get_today_data():
-    today_data = requests.get("https://corona.lmao.ninja/v2/all?yesterday")
-    today_country_data = requests.get("https://corona.lmao.ninja/v2/jhucsse")
-
-    today_data = today_data.json()
-    today_country_data = today_country_data.json()
+    today_data = fetch.read_json(av.today_url)
+    today_country_data = fetch.read_json(av.jhucsse_url)
 
     return today_data, today_country_data
 
@@ -24,12 +22,13 @@ def cases_object(array):
     return {**obj1, "updatedAt": [i["updatedAt"] for i in array]}
 
 
-def choose_country(array, country):
-    return [i for i in array if (i["country"] == country)]
+def choose_country(provinces, country):
+    # provinces is the snapshot's index of the v2/jhucsse records by country
+    return provinces.get(country, [])
 
 
-def get_final_object(country, array):
-    return cases_object(choose_country(array, country))
+def get_final_object(country, provinces):
+    return cases_object(choose_country(provinces, country))
 
 
 def get_country_frame(country):
@@ -87,7 +86,7 @@ def table_province_data(data, metric):
 """
 Examples:
 today_data, today_country_data = get_today_data()
-country_stats = get_country_frame(choose_country(today_country_data, "India"))
+country_stats = get_country_frame(choose_country(snapshot.current().provinces, "India"))
 
 bar_chart = plot_province(country_stats, "Confirmed", "Confirmed Cases")
 table = table_province_data(country_stats, "Confirmed")
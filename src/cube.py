@@ -0,0 +1,110 @@
+# Imports
+import numpy as np
+import pandas as pd
+import store
+
+METRICS = store.METRICS
+
+
+def positions(dates, when):
+    # Binary search for the last date on or before each of when (as of lookups),
+    # when is a single date or a list of them
+    dates = np.asarray(dates)
+    found = dates.searchsorted(np.asarray(when, dtype=dates.dtype), side="right") - 1
+    if np.any(found < 0):
+        raise KeyError(f"{when} is before the first date")
+    return found
+
+
+def window(dates, start=None, end=None):
+    # The dates from start to end, both included, as a slice of positions
+    first = 0 if start is None else dates.searchsorted(pd.Timestamp(start), side="left")
+    last = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end), side="right")
+    return slice(first, last)
+
+
+class Cube(object):
+    """
+    All the time series in one dense array of shape (countries, dates, metrics).
+
+     countries: list of country names, in the order of the first axis
+     dates: DatetimeIndex of the second axis
+     values: 3D int array
+    """
+
+    def __init__(self, countries, dates, values):
+        self.countries = list(countries)
+        self.dates = pd.DatetimeIndex(dates)
+        self.values = values
+        self.index = {country: i for i, country in enumerate(self.countries)}
+        self.metric_index = {metric: i for i, metric in enumerate(METRICS)}
+
+    def series(self, metric, country, values=None):
+        # The whole history of one metric for one country, values can be any
+        # array shaped like the cube, such as the derived series
+        values = self.values if values is None else values
+        return values[self.index[country], :, self.metric_index[metric]]
+
+    def country(self, country):
+        # (dates, metrics) for one country
+        return self.values[self.index[country]]
+
+    def metric(self, metric, values=None):
+        # (countries, dates) for one metric, of the cube or of any array shaped like it
+        values = self.values if values is None else values
+        return values[:, :, self.metric_index[metric]]
+
+    def day(self, date):
+        # (countries, metrics) on one date
+        return self.values[:, self.dates.get_loc(pd.Timestamp(date))]
+
+    def asof(self, metric, country, when, values=None):
+        # The value on, or on the last date before, each of when
+        return self.series(metric, country, values)[positions(self.dates, when)]
+
+    def between(self, metric, country, start=None, end=None, values=None):
+        # (dates, values) of one country from start to end, both views of the cube
+        dates = window(self.dates, start, end)
+        return self.dates[dates], self.series(metric, country, values)[dates]
+
+    def frame(self, metric):
+        # The wide (country, dates...) layout the rest of the app was written against
+        df = pd.DataFrame(self.metric(metric), columns=self.dates)
+        df.insert(0, "country", self.countries)
+        return df
+
+
+def build(store_dir=store.STORE_DIR, meta=None):
+    # meta picks the version built, the latest one by default
+    meta = store.read_meta(store_dir) if meta is None else meta
+    if meta is None:
+        meta = store.refresh(store_dir=store_dir)
+    entries = meta["metrics"]
+
+    countries = sorted(set().union(*[entries[m]["countries"] for m in METRICS]))
+    shared = set.intersection(*[set(entries[m]["dates"]) for m in METRICS])
+    labels = [d for d in entries[METRICS[0]]["dates"] if d in shared]
+
+    values = np.zeros((len(countries), len(labels), len(METRICS)), dtype=store.DTYPE)
+    for k, metric in enumerate(METRICS):
+        # Aligning each metric on the shared countries and dates, missing rows stay 0
+        df = pd.DataFrame(
+            store.open_metric(metric, meta, store_dir),
+            index=entries[metric]["dates"],
+            columns=entries[metric]["countries"],
+        )
+        df = df.reindex(index=labels, columns=countries, fill_value=0)
+        values[:, :, k] = df.values.T
+
+    return Cube(countries, pd.to_datetime(labels, format="%m/%d/%y"), values)
+
+
+"""
+Examples:
+data_cube = snapshot.current().cube
+data_cube = ingest.get_cube()
+india_deaths = data_cube.series("deaths", "India")
+confirmed = data_cube.metric("confirmed")
+lastweek, lastmonth = data_cube.asof("confirmed", "India", ["2021-05-01", "2021-04-08"])
+dates, values = data_cube.between("deaths", "India", "2021-04-01", "2021-04-30")
+"""
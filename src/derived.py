@@ -0,0 +1,54 @@
+# Imports
+from collections import namedtuple
+import numpy as np
+
+# Series derived from the cumulative counts of the cube. Every array has the
+# cube's (countries, dates, metrics) shape and is computed for all countries
+# at once, so callbacks only ever slice them.
+
+Derived = namedtuple("Derived", ["daily", "rolling7", "rolling14", "growth"])
+
+
+def daily_counts(values):
+    # New counts per day, the first day has nothing to compare with and is 0
+    return np.diff(values, axis=1, prepend=values[:, :1])
+
+
+def rolling_mean(daily, window):
+    # Trailing mean over window days from a running sum, NaN until the window is full
+    mean = np.full(daily.shape, np.nan)
+    if daily.shape[1] < window:
+        return mean
+    total = np.cumsum(daily, axis=1, dtype="float64")
+    mean[:, window - 1] = total[:, window - 1]
+    mean[:, window:] = total[:, window:] - total[:, :-window]
+    mean[:, window - 1 :] /= window
+    return mean
+
+
+def week_over_week(rolling7):
+    # Growth of the last 7 days against the 7 days before them, NaN if there were none
+    growth = np.full(rolling7.shape, np.nan)
+    previous, latest = rolling7[:, :-7], rolling7[:, 7:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth[:, 7:] = np.where(previous > 0, latest / previous - 1, np.nan)
+    return growth
+
+
+def build(values):
+    daily = daily_counts(values)
+    rolling7 = rolling_mean(daily, 7)
+    return Derived(
+        daily=daily,
+        rolling7=rolling7,
+        rolling14=rolling_mean(daily, 14),
+        growth=week_over_week(rolling7),
+    )
+
+
+"""
+Examples:
+derived = derived.build(cube.values)
+india_new_cases = cube.series("confirmed", "India", derived.daily)
+world = derived.build(cube.values.sum(axis=0, keepdims=True))
+"""
@@ -0,0 +1,70 @@
+# Imports
+import os
+import numpy as np
+
+# Full history series have a point for every day, far more than a chart has
+# pixels for. Largest-Triangle-Three-Buckets keeps the points that shape the
+# line the most, so the browser gets a few hundred points that look the same.
+
+# The width in pixels the full history charts are drawn at
+CHART_WIDTH = int(os.getenv("COVIDASH_CHART_WIDTH", "1200"))
+
+# Points drawn per pixel of chart width
+POINTS_PER_PIXEL = 0.5
+
+
+def budget(width=CHART_WIDTH):
+    return max(int(width * POINTS_PER_PIXEL), 3)
+
+
+def lttb(y, points):
+    # Positions of the points to keep, the first and the last are always kept.
+    # The days are evenly spaced, so their positions stand in for the x values
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # points - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # The third corner of the triangle is the average of the next bucket
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = y[next_start:next_end].mean()
+        x = np.arange(start, end)
+        area = np.abs((a - avg_x) * (y[start:end] - y[a]) - (a - x) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def positions(y, points=None, keep=()):
+    # lttb plus the highest point and any position in keep, such as the join with a forecast
+    y = np.asarray(y, dtype="float64")
+    points = budget() if points is None else points
+    if len(y) <= points:
+        return np.arange(len(y))
+    extra = list(keep)
+    if not np.isnan(y).all():
+        extra.append(int(np.nanargmax(y)))
+    return np.union1d(lttb(np.nan_to_num(y), points), np.asarray(extra, dtype=int))
+
+
+def frame(df, column, points=None, keep=()):
+    # The rows of df to draw, chosen on column
+    return df.iloc[positions(df[column].values, points, keep)]
+
+
+"""
+Examples:
+data = downsample.frame(data, "Total", keep=[len(data) - 1])
+rows = downsample.positions(series.values, downsample.budget(800))
+"""
@@ -0,0 +1,134 @@
+# Imports
+import os
+import io
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) writers of the same entry are not serialized
+    fcntl = None
+
+# Every upstream response is kept on disk next to its ETag and Last-Modified values.
+# Later requests for the same url are sent with If-None-Match / If-Modified-Since,
+# and a 304 from the server is answered from the copy on disk.
+
+CACHE_DIR = os.getenv(
+    "COVIDASH_HTTP_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "http_cache"),
+)
+
+TIMEOUT = 30
+
+log = logging.getLogger(__name__)
+
+
+def cache_paths(url, cache_dir=CACHE_DIR):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key + ".body"), os.path.join(cache_dir, key + ".json")
+
+
+def read_entry(url, cache_dir=CACHE_DIR):
+    body_path, meta_path = cache_paths(url, cache_dir)
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if meta.get("url") != url or not os.path.exists(body_path):
+        return None
+    return meta
+
+
+@contextmanager
+def entry_lock(url, cache_dir=CACHE_DIR):
+    # Every worker fetches the same urls, only one of them may write an entry at a time
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_paths(url, cache_dir)[0] + ".lock", "w") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def write_entry(url, response, cache_dir=CACHE_DIR):
+    body_path, meta_path = cache_paths(url, cache_dir)
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    # The body is replaced before the validators so they never describe a stale body,
+    # and under the lock so they always describe the same response
+    with entry_lock(url, cache_dir):
+        for path, content, mode in [
+            (body_path, response.content, "wb"),
+            (meta_path, json.dumps(meta), "w"),
+        ]:
+            fd, tmp = tempfile.mkstemp(dir=cache_dir)
+            with os.fdopen(fd, mode) as fh:
+                fh.write(content)
+            os.replace(tmp, path)
+
+
+def get(url, cache_dir=CACHE_DIR, headers=None, timeout=TIMEOUT):
+    # Returns the body of the url, and whether it changed since the cached copy
+    request_headers = dict(headers or {})
+    meta = read_entry(url, cache_dir)
+    if meta is not None:
+        if meta["etag"]:
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta["last_modified"]:
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = requests.get(url, headers=request_headers, timeout=timeout)
+
+    if response.status_code == 304 and meta is not None:
+        with open(cache_paths(url, cache_dir)[0], "rb") as fh:
+            return fh.read(), False
+
+    response.raise_for_status()
+    if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+        write_entry(url, response, cache_dir)
+    return response.content, True
+
+
+def read_csv(url, cache_dir=CACHE_DIR, **kwargs):
+    content, _ = get(url, cache_dir)
+    return pd.read_csv(io.BytesIO(content), **kwargs)
+
+
+def read_json(url, cache_dir=CACHE_DIR):
+    content, _ = get(url, cache_dir)
+    return json.loads(content)
+
+
+def timed(name, job):
+    start = time.perf_counter()
+    result = job()
+    log.info("%s took %.2fs", name, time.perf_counter() - start)
+    return result
+
+
+def run_concurrently(jobs):
+    # jobs maps a name to a function taking no arguments, each one runs on its own thread
+    # so the slowest job, not the sum of all of them, decides how long this takes
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as pool:
+        futures = {name: pool.submit(timed, name, job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+"""
+Examples:
+content, changed = fetch.get(av.main_url + "time_series_covid19_deaths_global.csv")
+country_cases = fetch.read_csv(av.cases_country_url)
+today_data = fetch.read_json(av.today_url)
+results = fetch.run_concurrently({"v2/all": lambda: fetch.read_json(av.today_url)})
+"""
@@ -0,0 +1,175 @@
+# Imports
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+# Run from src with `python fetch_check.py`, this is a check script and not part of
+# the app. It serves a few time series files from a temporary directory with
+# http.server, points app_vars at it and refreshes a store there three times:
+# the first refresh downloads everything, the second gets 304s and reads nothing
+# again, the third sees one file change and appends its new date, the fourth sees
+# upstream revise dates already stored. Last, many responses are written to the
+# same cache entry at once.
+
+work = tempfile.mkdtemp(prefix="covidash-check-")
+os.environ["COVIDASH_HTTP_CACHE_DIR"] = os.path.join(work, "http_cache")
+
+import requests
+import app_vars as av
+import fetch
+import store
+
+STORE_DIR = os.path.join(work, "store")
+
+FIXTURES = os.path.join(work, "upstream")
+
+statuses = []
+
+
+class Handler(SimpleHTTPRequestHandler):
+    def log_request(self, code="-", size="-"):
+        statuses.append(int(code))
+
+
+def write_fixture(metric, dates, steps=(10, 20)):
+    # Two countries whose counts grow by 10 and 20 a day
+    header = ",".join(store.ID_COLUMNS + dates)
+    rows = [
+        ",".join(["", country, "0", "0"] + [str(step * n) for n in range(len(dates))])
+        for country, step in zip(["India", "US"], steps)
+    ]
+    with open(os.path.join(FIXTURES, store.filenames[metric]), "w") as fh:
+        fh.write("\n".join([header] + rows) + "\n")
+
+
+def serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=FIXTURES))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def counting_parses():
+    # Counts the calls to store.read_new_columns, which parses a fetched file
+    parses = []
+    read_new_columns = store.read_new_columns
+
+    def wrapper(*args, **kwargs):
+        parses.append(args)
+        return read_new_columns(*args, **kwargs)
+
+    store.read_new_columns = wrapper
+    return parses
+
+
+def response(n):
+    # A response with its own body and validators, as the nth worker got it
+    stand_in = requests.Response()
+    stand_in._content = f"body {n}".encode("utf-8") * 1000
+    stand_in.headers["ETag"] = f'"{n}"'
+    return stand_in
+
+
+def concurrent_writes(n=32):
+    # Whether the entry written last by n concurrent writers still pairs a body
+    # with its own validators
+    url = av.main_url + "concurrent.csv"
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        list(pool.map(lambda i: fetch.write_entry(url, response(i)), range(n)))
+    etag = fetch.read_entry(url)["etag"]
+    with open(fetch.cache_paths(url)[0], "rb") as fh:
+        return fh.read() == response(int(etag.strip('"'))).content
+
+
+def check(name, passed):
+    print(f"{'ok' if passed else 'FAILED':<8}{name}")
+    return passed
+
+
+def main():
+    dates = ["1/22/20", "1/23/20"]
+    os.makedirs(FIXTURES)
+    for metric in store.METRICS:
+        write_fixture(metric, dates)
+    server = serve()
+    # Set after store was imported, which refresh has to pick up
+    av.main_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    parses = counting_parses()
+    results = []
+
+    meta = store.refresh(store_dir=STORE_DIR)
+    results.append(check("first refresh downloads every file", statuses == [200] * 3))
+    results.append(check("first refresh parses every file", len(parses) == 3))
+
+    del statuses[:], parses[:]
+    url = av.main_url + store.filenames["confirmed"]
+    with open(os.path.join(FIXTURES, store.filenames["confirmed"]), "rb") as fh:
+        upstream = fh.read()
+    content, changed = fetch.get(url)
+    results.append(check("an unchanged file gets a 304", statuses == [304]))
+    results.append(
+        check("a 304 is answered from disk", content == upstream and not changed)
+    )
+
+    del statuses[:]
+    again = store.refresh(store_dir=STORE_DIR)
+    results.append(check("an unchanged store gets 304s", statuses == [304] * 3))
+    results.append(check("an unchanged store parses nothing", parses == []))
+    same = again["version"] == meta["version"]
+    results.append(check("an unchanged store keeps its version", same))
+
+    # Last-Modified has a resolution of one second
+    time.sleep(1.1)
+    del statuses[:]
+    write_fixture("confirmed", dates + ["1/24/20"])
+    changed = store.refresh(store_dir=STORE_DIR)
+    results.append(
+        check("a changed file is downloaded again", sorted(statuses) == [200, 304, 304])
+    )
+    results.append(check("only the changed file is parsed", len(parses) == 1))
+    results.append(
+        check(
+            "a new date moves the version",
+            changed["version"] == meta["version"] + 1
+            and changed["metrics"]["confirmed"]["dates"] == dates + ["1/24/20"],
+        )
+    )
+
+    time.sleep(1.1)
+    write_fixture("deaths", dates, steps=(15, 20))
+    revised = store.refresh(store_dir=STORE_DIR)
+    deaths = store.open_metric("deaths", revised, STORE_DIR)
+    world = store.open_world("deaths", revised, STORE_DIR)
+    results.append(
+        check(
+            "a revised history is reread",
+            revised["version"] == changed["version"] + 1
+            and deaths.tolist() == [[0, 0], [15, 20]]
+            and world.tolist() == [0, 35],
+        )
+    )
+
+    results.append(
+        check("concurrent writers keep body and validators paired", concurrent_writes())
+    )
+    leftovers = [f for f in os.listdir(fetch.CACHE_DIR) if f.startswith("tmp")]
+    results.append(check("concurrent writers leave no temporary files", not leftovers))
+
+    server.shutdown()
+    shutil.rmtree(work)
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
+
+
+"""
+Examples:
+python fetch_check.py
+"""
@@ -0,0 +1,165 @@
+# Imports
+import os
+import json
+import base64
+import threading
+from functools import wraps
+from collections import OrderedDict, Counter
+import numpy as np
+import plotly.io as pio
+import plotly.graph_objects as go
+
+# Figures are serialized to JSON once and kept as bytes, so a callback serving a
+# cached figure never builds or validates Plotly objects again. The most recently
+# used figures stay in memory; others can be spilled to a second cache that has
+# get and set, such as the Flask-Caching store the workers share.
+
+MAX_ITEMS = int(os.getenv("COVIDASH_FIGURE_MEMORY_ITEMS", "32"))
+
+# Set COVIDASH_FIGURE_SPILL=0 to keep the figures in memory only
+SPILL = os.getenv("COVIDASH_FIGURE_SPILL", "1") != "0"
+
+# With COVIDASH_TYPED_ARRAYS=1 the numeric x, y, lat and lon arrays of every trace
+# are sent as base64 typed arrays instead of JSON numbers, which needs plotly.js 2.28
+# or later in the browser (dash 2.15 or later)
+TYPED_ARRAYS = os.getenv("COVIDASH_TYPED_ARRAYS", "0") == "1"
+
+TYPED_KEYS = ["x", "y", "lat", "lon"]
+
+# Short arrays are left as JSON, the encoding only pays off on long series
+TYPED_MIN_LENGTH = 32
+
+memory = OrderedDict()
+counts = Counter()
+lock = threading.Lock()
+
+
+def typed_array(values):
+    # {"dtype", "bdata"} as plotly.js decodes it, anything not numeric is returned as is
+    array = np.asarray(values)
+    if array.ndim != 1 or array.dtype.kind not in "iuf" or len(array) < TYPED_MIN_LENGTH:
+        return values
+    # plotly.js has no 64 bit integers
+    if array.dtype.kind in "iu" and np.abs(array).max() <= np.iinfo("int32").max:
+        array = array.astype("<i4")
+    else:
+        array = array.astype("<f8")
+    return {
+        "dtype": array.dtype.str[1:],
+        "bdata": base64.b64encode(array.tobytes()).decode("ascii"),
+    }
+
+
+def is_figure(value):
+    # Callbacks return figures as go.Figure or as plain dicts, like the maps do
+    return isinstance(value, go.Figure) or (isinstance(value, dict) and "data" in value)
+
+
+def map_traces(fig, function):
+    # A copy of the figure as a dict with function applied to every trace, the
+    # figure passed in is left as it is
+    figure = dict(fig.to_dict() if isinstance(fig, go.Figure) else fig)
+    figure["data"] = [function(dict(trace)) for trace in figure.get("data", [])]
+    if "frames" in figure:
+        figure["frames"] = [
+            dict(frame, data=[function(dict(trace)) for trace in frame.get("data", [])])
+            for frame in figure["frames"]
+        ]
+    return figure
+
+
+def encode_trace(trace):
+    for key in TYPED_KEYS:
+        if key in trace:
+            trace[key] = typed_array(trace[key])
+    return trace
+
+
+def decode_trace(trace):
+    for key, value in trace.items():
+        if isinstance(value, dict) and "bdata" in value:
+            data = base64.b64decode(value["bdata"])
+            trace[key] = np.frombuffer(data, dtype=value["dtype"]).tolist()
+    return trace
+
+
+def encode(fig):
+    # The figure as a dict with its trace arrays encoded as typed arrays
+    return map_traces(fig, encode_trace)
+
+
+def decode(fig):
+    # The reverse of encode, every typed array of the figure as a plain list
+    return map_traces(fig, decode_trace)
+
+
+def typed(fig):
+    return encode(fig) if TYPED_ARRAYS else fig
+
+
+def typed_figures(callback):
+    # Applies typed to every figure a callback returns
+    @wraps(callback)
+    def wrapper(*args, **kwargs):
+        result = callback(*args, **kwargs)
+        if isinstance(result, tuple):
+            return tuple(typed(r) if is_figure(r) else r for r in result)
+        return typed(result) if is_figure(result) else result
+
+    return wrapper
+
+
+def serialize(fig):
+    # The figures are built by this app, validating them again while encoding is wasted work
+    return pio.to_json(typed(fig), validate=False).encode("utf-8")
+
+
+def remember(key, value, outcome):
+    with lock:
+        counts[outcome] += 1
+        memory[key] = value
+        memory.move_to_end(key)
+        while len(memory) > MAX_ITEMS:
+            memory.popitem(last=False)
+
+
+def get(key, build, spill=None):
+    # JSON bytes of the figure under key, build returns the figure on a miss
+    with lock:
+        value = memory.get(key)
+        if value is not None:
+            memory.move_to_end(key)
+            counts["hits"] += 1
+            return value
+
+    value = spill.get(key) if spill is not None else None
+    outcome = "spill_hits"
+    if value is None:
+        outcome = "misses"
+        value = serialize(build())
+        if spill is not None:
+            spill.set(key, value)
+    remember(key, value, outcome)
+    return value
+
+
+def load(key, build, spill=None):
+    # The figure as plain dicts and lists, which Dash encodes without touching Plotly
+    return json.loads(get(key, build, spill))
+
+
+def stats():
+    with lock:
+        return dict(
+            counts,
+            items=len(memory),
+            bytes=sum(len(value) for value in memory.values()),
+        )
+
+
+"""
+Examples:
+fig = figure_json.load(f"map/confirmed/{version}", lambda: maps.plot_study(...), cache)
+figure_json.stats()
+fig = figure_json.typed(cnn.plot_graph(data, pred))
+"""
@@ -0,0 +1,234 @@
+# Imports
+import os
+import sys
+import json
+from functools import lru_cache
+import numpy as np
+import clusters
+
+# Country boundaries for the choropleth map, served by the app itself so the map
+# needs no tile service or token. data/countries.npz is built offline from the
+# public domain Natural Earth 1:110m admin 0 countries with
+# `python geometry.py ne_110m_admin_0_countries.geojson data/countries.npz NAME`,
+# which simplifies every boundary once per resolution and stores the points as
+# int32 ten thousandths of a degree, each as the step from the point before it
+# like TopoJSON does. Countries too small for that scale, such as Monaco or the
+# Holy See, have no boundary and are left out of the map.
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "countries.npz")
+
+# Douglas-Peucker tolerance of every resolution, in degrees
+RESOLUTIONS = {"low": 0.5, "medium": 0.1, "high": 0.02}
+
+# Points are stored in ten thousandths of a degree, about 11 m, so even the
+# smallest countries keep distinct points
+SCALE = 10000
+
+# Where the app serves every resolution, figures only carry this URL so the browser
+# downloads each resolution once however often the values change
+URL = "/geometry/{resolution}.json"
+
+# The coarsest resolution used is the one off by at most this many pixels
+MAX_ERROR_PIXELS = 2
+
+# Natural Earth names that differ from the JHU country names
+NAMES = {
+    "United States of America": "US",
+    "South Korea": "Korea, South",
+    "North Korea": "Korea, North",
+    "Myanmar": "Burma",
+    "Taiwan": "Taiwan*",
+    "Democratic Republic of the Congo": "Congo (Kinshasa)",
+    "Republic of the Congo": "Congo (Brazzaville)",
+    "Republic of Congo": "Congo (Brazzaville)",
+    "Ivory Coast": "Cote d'Ivoire",
+    "Czech Republic": "Czechia",
+    "eSwatini": "Eswatini",
+    "Swaziland": "Eswatini",
+    "Macedonia": "North Macedonia",
+    "United Republic of Tanzania": "Tanzania",
+    "Republic of Serbia": "Serbia",
+    "East Timor": "Timor-Leste",
+    "Vatican": "Holy See",
+    "Palestine": "West Bank and Gaza",
+    "The Bahamas": "Bahamas",
+    "Guinea Bissau": "Guinea-Bissau",
+    "Cape Verde": "Cabo Verde",
+    "Federated States of Micronesia": "Micronesia",
+    "Lao PDR": "Laos",
+    # The short NAME column of the 1:110m file
+    "Bosnia and Herz.": "Bosnia and Herzegovina",
+    "Central African Rep.": "Central African Republic",
+    "Congo": "Congo (Brazzaville)",
+    "Côte d'Ivoire": "Cote d'Ivoire",
+    "Dem. Rep. Congo": "Congo (Kinshasa)",
+    "Dominican Rep.": "Dominican Republic",
+    "Eq. Guinea": "Equatorial Guinea",
+    "S. Sudan": "South Sudan",
+    "Solomon Is.": "Solomon Islands",
+}
+
+
+def cross(vector, points):
+    # z of the cross products of vector with every point, np.cross dropped 2d vectors
+    return vector[0] * points[:, 1] - vector[1] * points[:, 0]
+
+
+def simplify(ring, tolerance):
+    # Douglas-Peucker, keeping the points further than tolerance from the simplified line
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = ring[first], ring[last]
+        points = ring[first + 1 : last]
+        segment = end - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distance = np.hypot(*(points - start).T)
+        else:
+            distance = np.abs(cross(segment, points - start)) / length
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.extend([(first, middle), (middle, last)])
+    return ring[keep]
+
+
+def minimal(ring):
+    # The triangle spanning ring, for rings simplification leaves without an area
+    start = ring[0]
+    far = int(np.argmax(np.hypot(*(ring - start).T)))
+    segment = ring[far] - start
+    third = int(np.argmax(np.abs(cross(segment, ring - start))))
+    return ring[[0, far, third, 0]]
+
+
+def polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    return geometry["coordinates"]
+
+
+def pack(features, tolerance):
+    # Flattens (name, polygons) into coordinate and offset arrays
+    coords, ring_ends, polygon_ends, feature_ends = [], [], [], []
+    points = 0
+    for _, country in features:
+        kept = len(polygon_ends)
+        for polygon in country:
+            rings = [
+                simplify(np.asarray(ring, dtype="float64"), tolerance)
+                for ring in polygon
+            ]
+            # Rings that collapse below a triangle are dropped, and with the outer
+            # ring the whole polygon
+            rings = rings[:1] + [ring for ring in rings[1:] if len(ring) >= 4]
+            if len(rings[0]) < 4:
+                continue
+            for ring in rings:
+                coords.append(np.round(ring * SCALE).astype("int32"))
+                points += len(ring)
+                ring_ends.append(points)
+            polygon_ends.append(len(ring_ends))
+        if len(polygon_ends) == kept:
+            # A country too small for the tolerance keeps a triangle of its
+            # largest polygon, so it still has a shape to color
+            outer = max(
+                (np.asarray(polygon[0], dtype="float64") for polygon in country),
+                key=len,
+            )
+            coords.append(np.round(minimal(outer) * SCALE).astype("int32"))
+            points += 4
+            ring_ends.append(points)
+            polygon_ends.append(len(ring_ends))
+        feature_ends.append(len(polygon_ends))
+    coords = np.concatenate(coords)
+    return {
+        "coords": np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype="int32")),
+        "ring_ends": np.asarray(ring_ends, dtype="int32"),
+        "polygon_ends": np.asarray(polygon_ends, dtype="int32"),
+        "feature_ends": np.asarray(feature_ends, dtype="int32"),
+    }
+
+
+def build(source, path=PATH, name_key="ADMIN"):
+    # Run offline, writes every resolution of the boundaries in source to path
+    with open(source) as fh:
+        collection = json.load(fh)
+    features = [
+        (
+            NAMES.get(feature["properties"][name_key], feature["properties"][name_key]),
+            polygons(feature["geometry"]),
+        )
+        for feature in collection["features"]
+        if feature.get("geometry")
+    ]
+    arrays = {"names": np.asarray([name for name, _ in features])}
+    for resolution, tolerance in RESOLUTIONS.items():
+        for key, array in pack(features, tolerance).items():
+            arrays[f"{resolution}_{key}"] = array
+    np.savez_compressed(path, **arrays)
+
+
+def resolution(zoom):
+    # The coarsest resolution whose tolerance stays within MAX_ERROR_PIXELS at zoom
+    degrees = MAX_ERROR_PIXELS * 360 / (clusters.WORLD_PIXELS * 2 ** zoom)
+    fitting = [r for r, tolerance in RESOLUTIONS.items() if tolerance <= degrees]
+    return max(fitting, key=RESOLUTIONS.get) if fitting else "high"
+
+
+@lru_cache(maxsize=1)
+def load(path=PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+@lru_cache(maxsize=len(RESOLUTIONS))
+def geojson(resolution="medium"):
+    # The boundaries as GeoJSON bytes, built once per resolution. Every feature has
+    # its JHU country name as id, None if the file was not built
+    data = load()
+    if data is None:
+        return None
+    coords = np.cumsum(data[f"{resolution}_coords"], axis=0) / SCALE
+    ring_ends = data[f"{resolution}_ring_ends"]
+    polygon_ends = data[f"{resolution}_polygon_ends"]
+    feature_ends = data[f"{resolution}_feature_ends"]
+
+    rings = np.split(coords, ring_ends[:-1])
+    polygon_rings = np.split(np.arange(len(rings)), polygon_ends[:-1])
+    feature_polygons = np.split(np.arange(len(polygon_rings)), feature_ends[:-1])
+    features = [
+        {
+            "type": "Feature",
+            "id": str(name),
+            "properties": {"name": str(name)},
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [rings[r].tolist() for r in polygon_rings[p]] for p in polygon_list
+                ],
+            },
+        }
+        for name, polygon_list in zip(data["names"], feature_polygons)
+    ]
+    collection = {"type": "FeatureCollection", "features": features}
+    return json.dumps(collection, separators=(",", ":")).encode("utf-8")
+
+
+if __name__ == "__main__":
+    build(*sys.argv[1:])
+
+
+"""
+Examples:
+python geometry.py ne_110m_admin_0_countries.geojson data/countries.npz NAME
+boundaries = geometry.geojson(geometry.resolution(zoom=2))
+"""
@@ -0,0 +1,108 @@
+# Imports
+from collections import namedtuple
+import math
+import numpy as np
+
+# Epidemic indicators for every country and metric, computed from the derived
+# daily counts. Like the derived series every array has the cube's
+# (countries, dates, metrics) shape. Every value only looks back a fixed number
+# of days, so when days are appended only the new days are computed.
+
+Indicators = namedtuple("Indicators", ["growth_rate", "doubling_time", "rt"])
+
+# Serial interval of COVID-19 as a gamma distribution, in days (Nishiura et al. 2020)
+SERIAL_INTERVAL_MEAN = 4.7
+SERIAL_INTERVAL_SD = 2.9
+SERIAL_INTERVAL_DAYS = 20
+
+# Days the reproduction number is smoothed over
+RT_WINDOW = 7
+
+# The days before a date any indicator of that date depends on
+LOOKBACK = SERIAL_INTERVAL_DAYS + RT_WINDOW
+
+
+def serial_interval(
+    mean=SERIAL_INTERVAL_MEAN, sd=SERIAL_INTERVAL_SD, days=SERIAL_INTERVAL_DAYS
+):
+    # Weights of the days 1 to days after infection, summing to 1
+    shape, scale = (mean / sd) ** 2, sd ** 2 / mean
+    s = np.arange(1, days + 1, dtype="float64")
+    density = s ** (shape - 1) * np.exp(-s / scale)
+    density /= math.gamma(shape) * scale ** shape
+    return density / density.sum()
+
+
+def rolling_sum(values, window):
+    total = np.cumsum(values, axis=1)
+    total[:, window:] = total[:, window:] - total[:, :-window]
+    return total
+
+
+def growth_rate(rolling7):
+    # Exponential growth per day of the 7 day mean against the week before
+    rate = np.full(rolling7.shape, np.nan)
+    previous, latest = rolling7[:, :-7], rolling7[:, 7:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate[:, 7:] = np.where(
+            (previous > 0) & (latest > 0), np.log(latest / previous) / 7, np.nan
+        )
+    return rate
+
+
+def doubling_time(rate):
+    # Days for the counts to double at the current growth rate, only while they grow
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(rate > 0, np.log(2) / rate, np.nan)
+
+
+def reproduction_number(daily, weights=None):
+    # Rt as the new counts over the counts expected from the days before them, weighted
+    # by the serial interval (Cori et al. 2013), both summed over RT_WINDOW days
+    weights = serial_interval() if weights is None else weights
+    incidence = np.clip(daily, 0, None).astype("float64")
+    infectiousness = np.zeros(incidence.shape)
+    for lag, weight in enumerate(weights, start=1):
+        infectiousness[:, lag:] += weight * incidence[:, :-lag]
+
+    new = rolling_sum(incidence, RT_WINDOW)
+    expected = rolling_sum(infectiousness, RT_WINDOW)
+    rt = np.full(incidence.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rt[:, RT_WINDOW:] = np.where(
+            expected[:, RT_WINDOW:] > 0,
+            new[:, RT_WINDOW:] / expected[:, RT_WINDOW:],
+            np.nan,
+        )
+    return rt
+
+
+def compute(daily, rolling7, start=0):
+    # Indicators of the dates from start on, using only the LOOKBACK days before start
+    first = max(start - LOOKBACK, 0)
+    rate = growth_rate(rolling7[:, first:])
+    computed = Indicators(
+        growth_rate=rate,
+        doubling_time=doubling_time(rate),
+        rt=reproduction_number(daily[:, first:]),
+    )
+    return Indicators(*[array[:, start - first :] for array in computed])
+
+
+def build(daily, rolling7, previous=None):
+    # previous holds the indicators of the same countries for the first dates, which
+    # never change once the store has them, so only the new dates are computed
+    if previous is None or previous.rt.shape[1] > daily.shape[1]:
+        return compute(daily, rolling7)
+    new = compute(daily, rolling7, start=previous.rt.shape[1])
+    return Indicators(
+        *[np.concatenate([old, tail], axis=1) for old, tail in zip(previous, new)]
+    )
+
+
+"""
+Examples:
+country = indicators.build(derived.daily, derived.rolling7)
+country = indicators.build(derived.daily, derived.rolling7, previous=country)
+india_rt = cube.series("confirmed", "India", country.rt)
+"""
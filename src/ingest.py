@@ -0,0 +1,293 @@
+# Imports
+from functools import lru_cache, partial
+import numpy as np
+import pandas as pd
+import app_vars as av
+import fetch
+import store
+import cube
+import derived
+import indicators
+import population
+import shared
+
+# The app, the forecaster and the github action all get their data from here.
+# Everything derived from the store is built once per store version and reused
+# until the store changes. The cube and the derived series are mapped from the
+# segment shared by all workers (see shared.py).
+
+# Bumped whenever build_segment adds or changes arrays, so segments published by
+# an older version of the app are rebuilt
+SEGMENT_LAYOUT = 2
+
+
+# The meta.json every loaded version was read with. The store only ever appends, so
+# the shapes of an older meta still read exactly that version after another worker
+# refreshed the store. Only the last few versions are kept
+metas = {}
+
+KEEP_METAS = 4
+
+
+def remember(meta):
+    metas[meta["version"]] = meta
+    while len(metas) > KEEP_METAS:
+        metas.pop(min(metas))
+    return meta
+
+
+def current_version():
+    meta = store.read_meta()
+    if meta is None:
+        meta = store.refresh()
+    return remember(meta)["version"]
+
+
+@lru_cache(maxsize=1)
+def load_frames(version):
+    return store.load(meta=metas[version])
+
+
+@lru_cache(maxsize=1)
+def load_data(version):
+    meta = metas[version]
+    frames = []
+    for metric in store.METRICS:
+        entry = meta["metrics"][metric]
+        # The store is already laid out as (dates x countries), so no transpose is needed
+        df = pd.DataFrame(
+            store.open_metric(metric, meta),
+            index=pd.to_datetime(entry["dates"], format="%m/%d/%y"),
+            columns=entry["countries"],
+            copy=False,
+        )
+        frames.append(df)
+    confirmed, deaths, recovered = frames
+    return deaths, recovered, confirmed
+
+
+@lru_cache(maxsize=1)
+def load_world(version):
+    # World totals per metric as date indexed series, read from the totals the store
+    # materialized when each date was appended
+    meta = metas[version]
+    return {
+        metric: pd.Series(
+            store.open_world(metric, meta),
+            index=pd.to_datetime(meta["metrics"][metric]["dates"], format="%m/%d/%y"),
+            copy=False,
+        )
+        for metric in store.METRICS
+    }
+
+
+def build_segment(meta):
+    data_cube = cube.build(meta=meta)
+    values = data_cube.values
+    # The world is derived like a single country, from the totals kept by the store
+    world = load_world(meta["version"])
+    world_values = np.stack(
+        [world[metric].reindex(data_cube.dates).values for metric in store.METRICS],
+        axis=-1,
+    )
+    country_series = derived.build(values)._asdict()
+    world_series = derived.build(world_values[np.newaxis])._asdict()
+
+    labels = {
+        "layout": SEGMENT_LAYOUT,
+        "countries": data_cube.countries,
+        "dates": [d.strftime("%Y-%m-%d") for d in data_cube.dates],
+        # A store rebuilt from revised history has other values for the same dates
+        "revisions": [meta["metrics"][m].get("revision", 0) for m in store.METRICS],
+    }
+    # The indicators of the dates the replaced segment already had are reused
+    previous = shared.latest(exclude=meta["version"])
+    country_indicators = indicators.build(
+        country_series["daily"],
+        country_series["rolling7"],
+        previous_indicators(previous, labels),
+    )._asdict()
+    world_indicators = indicators.build(
+        world_series["daily"],
+        world_series["rolling7"],
+        previous_indicators(previous, labels, "world_"),
+    )._asdict()
+
+    # The population table is joined once here, charts only pick the per 100k arrays
+    normalized = population.build(
+        data_cube.countries, values, country_series["daily"]
+    )._asdict()
+
+    arrays = {"values": values}
+    arrays.update(country_series)
+    arrays.update(normalized)
+    arrays.update(country_indicators)
+    arrays.update({"world_" + name: array for name, array in world_series.items()})
+    arrays.update({"world_" + name: array for name, array in world_indicators.items()})
+    return arrays, labels
+
+
+def previous_indicators(previous, labels, prefix=""):
+    # Indicators of an older segment, if it has the same countries, its dates are
+    # the first of the new ones and their history was not revised since
+    if previous is None:
+        return None
+    arrays, old = previous
+    names = [prefix + name for name in indicators.Indicators._fields]
+    if (
+        old["countries"] != labels["countries"]
+        or old["dates"] != labels["dates"][: len(old["dates"])]
+        or old.get("revisions") != labels["revisions"]
+        or any(name not in arrays for name in names)
+    ):
+        return None
+    return indicators.Indicators(*[arrays[name] for name in names])
+
+
+@lru_cache(maxsize=1)
+def load_segment(version):
+    return shared.load(
+        version, partial(build_segment, metas[version]), layout=SEGMENT_LAYOUT
+    )
+
+
+@lru_cache(maxsize=1)
+def load_cube(version):
+    arrays, labels = load_segment(version)
+    return cube.Cube(labels["countries"], pd.to_datetime(labels["dates"]), arrays["values"])
+
+
+@lru_cache(maxsize=1)
+def load_derived(version):
+    arrays, _ = load_segment(version)
+    return (
+        derived.Derived(**{name: arrays[name] for name in derived.Derived._fields}),
+        derived.Derived(
+            **{name: arrays["world_" + name] for name in derived.Derived._fields}
+        ),
+    )
+
+
+@lru_cache(maxsize=1)
+def load_indicators(version):
+    arrays, _ = load_segment(version)
+    fields = indicators.Indicators._fields
+    return (
+        indicators.Indicators(**{name: arrays[name] for name in fields}),
+        indicators.Indicators(**{name: arrays["world_" + name] for name in fields}),
+    )
+
+
+@lru_cache(maxsize=1)
+def load_normalized(version):
+    arrays, _ = load_segment(version)
+    return population.Normalized(
+        **{name: arrays[name] for name in population.Normalized._fields}
+    )
+
+
+def get_frames():
+    # (confirmed_global, deaths_global, recovered_global), one row per country
+    return load_frames(current_version())
+
+
+def get_data():
+    # (deaths, recovered, confirmed), one row per date and one column per country
+    return load_data(current_version())
+
+
+def get_cube():
+    return load_cube(current_version())
+
+
+def get_world():
+    return load_world(current_version())
+
+
+def get_derived():
+    # (per country, world) derived series
+    return load_derived(current_version())
+
+
+def get_indicators():
+    # (per country, world) growth rate, doubling time and Rt
+    return load_indicators(current_version())
+
+
+def get_normalized():
+    # Population, density and the per 100k counts of every country
+    return load_normalized(current_version())
+
+
+def prepare_country_cases(country_cases):
+    country_cases = country_cases.drop(
+        columns=[
+            "Last_Update",
+            "Incident_Rate",
+            "People_Tested",
+            "People_Hospitalized",
+            "UID",
+        ],
+    )
+
+    country_cases = country_cases.rename(
+        columns={
+            "Country_Region": "country",
+            "Confirmed": "confirmed",
+            "Deaths": "deaths",
+            "Recovered": "recovered",
+            "Active": "active",
+            "Mortality_Rate": "mortality",
+        },
+    )
+
+    country_cases_sorted = country_cases.sort_values("confirmed", ascending=False)
+    country_cases_sorted.index = [x for x in range(len(country_cases_sorted))]
+    return country_cases_sorted
+
+
+def collect(url=None, max_age=0):
+    # (store version, the data of collect_data), the time series come from the local
+    # store, which only fetches new dates. The frames are the ones of that version
+    results = fetch.run_concurrently(
+        {
+            "time series": lambda: store.refresh(url, max_age=max_age),
+            "cases_country.csv": lambda: fetch.read_csv(av.cases_country_url),
+        }
+    )
+    version = remember(results["time series"])["version"]
+    confirmed_global, deaths_global, recovered_global = load_frames(version)
+    country_cases_sorted = prepare_country_cases(results["cases_country.csv"])
+
+    return version, (
+        confirmed_global,
+        deaths_global,
+        recovered_global,
+        country_cases_sorted,
+    )
+
+
+def collect_data(url=None, max_age=0):
+    return collect(url, max_age)[1]
+
+
+def get_today_data():
+    results = fetch.run_concurrently(
+        {
+            "v2/all": lambda: fetch.read_json(av.today_url),
+            "v2/jhucsse": lambda: fetch.read_json(av.jhucsse_url),
+        }
+    )
+    today_data, today_country_data = results["v2/all"], results["v2/jhucsse"]
+
+    return today_data, today_country_data
+
+
+"""
+Examples:
+confirmed_global, deaths_global, recovered_global, country_cases_sorted = ingest.collect_data()
+deaths, recovered, confirmed = ingest.get_data()
+india_deaths = ingest.get_cube().series("deaths", "India")
+world_confirmed = ingest.get_world()["confirmed"]
+today_data, today_country_data = ingest.get_today_data()
+"""
@@ -1,16 +1,19 @@
 # Imports
 import app_vars as av
+import snapshot
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import chart_studio.plotly as py
 import chart_studio
-import requests
+import fetch
+import clusters
+import geometry
+import figure_json
 import os
-from itertools import chain
-from math import log
-from math import e
+import logging
+from functools import lru_cache, partial
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 API_KEY=os.getenv("API_KEY")
@@ -22,55 +25,52 @@ chart_studio.tools.set_credentials_file(
 
 mapbox_access_token = MAPBOX_ACCESS_TOKEN
 
-confirmed_global, deaths_global, recovered_global, country_cases_sorted = (
-    av.confirmed_global,
-    av.deaths_global,
-    av.recovered_global,
-    av.country_cases_sorted,
-)
-
+# "choropleth" fills the countries of the world map instead of drawing bubbles,
+# which needs data/countries.npz, see geometry.py
+MAP_MODE = os.getenv("COVIDASH_MAP_MODE", "bubbles")
 
+log = logging.getLogger(__name__)
 
+if MAP_MODE == "choropleth" and geometry.load() is None:
+    log.warning(
+        "COVIDASH_MAP_MODE is choropleth but %s is missing, build it with "
+        "geometry.py; the world map is drawn as bubbles until then",
+        geometry.PATH,
+    )
 
-def chainer(s):
-    return list(chain.from_iterable(s.astype(str).str.split(",")))
+# A mapbox style of a black background only, so the choropleth loads no tiles
+# and needs no access token
+BLANK_STYLE = {
+    "version": 8,
+    "sources": {},
+    "layers": [
+        {
+            "id": "background",
+            "type": "background",
+            "paint": {"background-color": "#000000"},
+        }
+    ],
+}
 
 
 def convert_df(df, cols):
-    df.dropna(inplace=False)
-    df.set_index(df[cols[0]].values)
-    L = []
-    for i in range(len(df)):
-        string = ""
-        for j in range(len(cols[1])):
-            if j != (len(cols[1]) - 1):
-                string = string + str(df[cols[1][j]].values[i]) + ","
-            else:
-                string = string + str(df[cols[1][j]].values[i])
-
-        L.append(string)
-
-    df["New"] = L
-
-    lens = df["New"].astype(str).str.split(",").map(len)
-
-
-    df = pd.DataFrame(
+    # One row per place and study, in place order, with the counts kept numeric.
+    # cols is [place column, [study columns], latitude column, longitude column]
+    studies = cols[1]
+    n = len(df)
+    return pd.DataFrame(
         {
-            "Country": np.repeat(df[cols[0]], lens),
-            "Lat": np.repeat(df[cols[-2]], lens),
-            "Long_": np.repeat(df[cols[-1]], lens),
-            "Count": chainer(df["New"]),
+            "Country": np.repeat(df[cols[0]].values, len(studies)),
+            "Lat": np.repeat(df[cols[-2]].values, len(studies)),
+            "Long_": np.repeat(df[cols[-1]].values, len(studies)),
+            # Row major, so the studies of a place follow each other
+            "Count": df[studies].values.reshape(-1),
+            "Study": np.tile(studies, n),
         }
     )
-    df["Study"] = [cols[1][i] for i in range(len(cols[1]))] * (
-        len(df.index) // len(cols[1])
-    )
-
-    return df
 
 
-def create_hovertemplate(df, study, country):
+def create_hovertemplate(study):
     emoji = (
         "💀"
         if study.lower() == "deaths"
@@ -78,42 +78,32 @@ def create_hovertemplate(df, study, country):
         if study.lower() == "recovered"
         else "🏥"
     )
-    return f"{emoji}: {format(int(float(df.loc[(df['Study'] == study) & (df['Country'] == country), 'Count'])),',d')}"
+    # customdata holds (place, count) for every point
+    return f"{emoji}: %{{customdata[1]:,d}}<extra>%{{customdata[0]}}</extra>"
 
 
 def create_data(df, study, color):
-    countries = list(df["Country"].value_counts().index)
-    data = []
-    df.dropna(inplace=True)
-
-    for country in countries:
-        try:
-            event_data = dict(
-                lat=df.loc[(df["Study"] == study) & (df["Country"] == country), "Lat"],
-                lon=df.loc[
-                    (df["Study"] == study) & (df["Country"] == country), "Long_"
-                ],
-                name=f"{country}",
-                marker={
-                    "size": log(
-                        float(
-                            df.loc[
-                                (df["Study"] == study) & (df["Country"] == country),
-                                "Count",
-                            ]
-                        ),
-                        1.5,
-                    ),
-                    "opacity": 0.5,
-                    "color": color,
-                },
-                type="scattermapbox",
-                hovertemplate=create_hovertemplate(df, study, country),
-            )
-            data.append(event_data)
-        except:
-            continue
-
+    # Every place is a point of one trace, instead of a trace per place
+    df = df[df["Study"] == study].dropna()
+    counts = df["Count"].values.astype("float64")
+    # The marker size is the log of the count, places without any are left out
+    df, counts = df[counts > 0], counts[counts > 0]
+    data = [
+        dict(
+            lat=df["Lat"].values,
+            lon=df["Long_"].values,
+            customdata=np.stack(
+                [df["Country"].values.astype(object), counts.astype("int64")], axis=-1
+            ),
+            marker={
+                "size": np.log(counts) / np.log(1.5),
+                "opacity": 0.5,
+                "color": color,
+            },
+            type="scattermapbox",
+            hovertemplate=create_hovertemplate(study),
+        )
+    ]
 
     return data
 
@@ -162,20 +152,21 @@ def update_layout(study, layout):
     return layout
 
 
-def get_lat_long(country, coord_df=country_cases_sorted):
-    lat = float(coord_df.loc[(coord_df["country"] == country), "Lat"])
-    long = float(coord_df.loc[(coord_df["country"] == country), "Long_"])
-    return lat, long
+def get_lat_long(country, coordinates=None):
+    # coordinates maps a country to (lat, long), the snapshot's index by default
+    if coordinates is None:
+        coordinates = snapshot.current().coordinates
+    return coordinates[country]
 
 
 def get_country_wise_data():
-    response = requests.get("https://corona.lmao.ninja/v2/jhucsse")
-    data = response.json()
+    data = fetch.read_json(av.jhucsse_url)
     return data
 
 
-def choose_country(array, country):
-    return [i for i in array if (i["country"] == country)]
+def choose_country(provinces, country):
+    # provinces is the snapshot's index of the v2/jhucsse records by country
+    return provinces.get(country, [])
 
 
 def get_country_frame(country):
@@ -184,7 +175,8 @@ def get_country_frame(country):
 
     coords = get("coordinates", country)
     stats = get("stats", country)
-    names = get("province", country)
+    # Countries without provinces have a single record whose province is null
+    names = [i["province"] or i["country"] for i in country]
 
     def make_column(string, main):
         return [i[string] for i in main]
@@ -194,7 +186,7 @@ def get_country_frame(country):
     df["lat"] = make_column("latitude", coords)
     df["lon"] = make_column("longitude", coords)
     df["Confirmed"] = make_column("confirmed", stats)
-    # df["Recoveries"] = make_column("recovered", stats)
+    df["Recoveries"] = make_column("recovered", stats)
     df["Deaths"] = make_column("deaths", stats)
     df = df[df["Provinces"] != "Unknown"]
     return df
@@ -227,10 +219,79 @@ def plot_study(
     return figure
 
 
-def plot_country(Country, data, study):
-    country = choose_country(data, Country)
-    df = get_country_frame(country)
-    columns = ["Provinces", ["Confirmed", "Recoveries", "Deaths"], "lat", "lon"]
+def create_choropleth_data(df, study, color, resolution):
+    # The boundaries are only referenced by URL, so switching the study only
+    # changes the values the figure sends
+    counts = pd.to_numeric(df[study], errors="coerce").values
+    df, counts = df[counts > 0], counts[counts > 0]
+    data = [
+        dict(
+            geojson=geometry.URL.format(resolution=resolution),
+            locations=df["country"].values,
+            # Colored by the log of the count, like the bubble sizes
+            z=np.log10(counts),
+            customdata=np.stack(
+                [df["country"].values.astype(object), counts.astype("int64")], axis=-1
+            ),
+            colorscale=[[0, "#1a1a1a"], [1, color]],
+            showscale=False,
+            marker={"line": {"width": 0.5, "color": "#444444"}},
+            type="choroplethmapbox",
+            hovertemplate=create_hovertemplate(study),
+        )
+    ]
+
+    return data
+
+
+def plot_choropleth(
+    starting_df,
+    study_dict,
+    zoom=2,
+    latitude=20.59,
+    longitude=78.96,
+):
+    # starting_df is country_cases_sorted, one row per country
+    color = study_dict["color"]
+    study = study_dict["study"]
+
+    data = create_choropleth_data(
+        starting_df, study, color, geometry.resolution(zoom)
+    )
+
+    layout = create_basic_layout(latitude, longitude, zoom)
+    del layout["mapbox"]["accesstoken"]
+    layout["mapbox"]["style"] = BLANK_STYLE
+    updated_layout = update_layout(study, layout)
+    figure = interactive_map(data, updated_layout)
+
+    return figure
+
+
+def plot_world(starting_df, cols, study_dict):
+    # The world map in MAP_MODE, bubbles as long as the boundaries were not built,
+    # which is logged when the module is imported
+    if MAP_MODE == "choropleth" and geometry.load() is not None:
+        return plot_choropleth(starting_df, study_dict)
+    return plot_study(starting_df, cols, study_dict)
+
+
+PROVINCE_COLUMNS = ["Provinces", ["Confirmed", "Recoveries", "Deaths"], "lat", "lon"]
+
+PROVINCE_ZOOM = 7.5
+
+
+@lru_cache(maxsize=256)
+def province_clusters(country, study, version):
+    # The clustered province points of every zoom level, version only keys the cache
+    df = get_country_frame(choose_country(snapshot.current().provinces, country))
+    df = convert_df(df, PROVINCE_COLUMNS)
+    return clusters.levels(df[df["Study"] == study])
+
+
+def plot_country(Country, study, zoom=PROVINCE_ZOOM, box=None):
+    # zoom picks the clusters and box crops them (see clusters.view), the map
+    # always opens at PROVINCE_ZOOM
     color = (
         "#45a2ff"
         if study == "Confirmed"
@@ -238,19 +299,47 @@ def plot_country(Country, data, study):
         if study == "Deaths"
         else "#42f587"
     )
-    d = dict(study=study.title(), color=color)
-    figure = plot_study(
-        df,
-        columns,
-        d,
-        country,
-        zoom=7.5,
-        latitude=get_lat_long(Country)[0],
-        longitude=get_lat_long(Country)[1],
+    study = study.title()
+    points = province_clusters(Country, study, snapshot.current().provinces_version)
+    points = points[clusters.level(zoom)]
+    # Upstream leaves some studies null, recoveries for most countries. Raising lets
+    # the callers fall back to another map instead of sending an empty one
+    if not (points["Count"] > 0).any():
+        raise ValueError(f"{Country} has no {study} to draw")
+    data = create_data(clusters.view(points, box), study, color)
+
+    latitude, longitude = get_lat_long(Country)
+    layout = update_layout(
+        study, create_basic_layout(latitude, longitude, PROVINCE_ZOOM)
     )
+    # Keeps the view the user zoomed to when the clusters of another level are swapped in
+    layout["uirevision"] = Country
+    figure = interactive_map(data, layout)
     return figure
 
 
+def fits(Country, study, zoom=PROVINCE_ZOOM):
+    # Whether the whole country's clusters at zoom fit in one map, uncropped
+    points = province_clusters(
+        Country, study.title(), snapshot.current().provinces_version
+    )
+    return len(points[clusters.level(zoom)]) <= clusters.MAX_MARKERS
+
+
+# The province map of a country is kept for every zoom level of its clusters until
+# the v2/jhucsse data changes, whatever else a refresh brings. Maps cropped to a
+# view are built on demand, from the clusters province_clusters keeps
+def province_map(Country, study, zoom=PROVINCE_ZOOM, spill=None, box=None):
+    level = clusters.level(zoom)
+    if box is not None:
+        return plot_country(Country, study, level, box)
+    return figure_json.load(
+        f"province/{Country}/{study}/{level}/{snapshot.current().provinces_version}",
+        partial(plot_country, Country, study, level),
+        spill,
+    )
+
+
 """
 Examples:
 confirmed = dict(study="confirmed", color="#45a2ff")
@@ -262,6 +351,11 @@ columns = ["country", ["deaths", "confirmed", "recovered"], "Lat", "Long_"]
 figure = plot_study(country_cases_sorted, columns, confirmed)
 py.iplot(figure)
 
-figure= plot_country("Japan", get_country_wise_data(), "Recoveries")
+figure = plot_choropleth(country_cases_sorted, deaths)
+figure = plot_world(country_cases_sorted, columns, confirmed)
+
+figure= plot_country("Japan", "Recoveries")
+figure= plot_country("US", "Confirmed", zoom=5)
+figure = province_map("US", "Confirmed", zoom=5, spill=cache)
 py.iplot(figure)
 """
\ No newline at end of file
@@ -0,0 +1,48 @@
+# Imports
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# data/population.csv is bundled with the app: mid 2020 population estimates of the
+# UN World Population Prospects and total areas in km2, under the country names
+# the JHU time series use. Cruise ships and events have no population and stay NaN.
+
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "population.csv")
+
+PER = 100000
+
+Normalized = namedtuple(
+    "Normalized", ["population", "density", "per100k", "daily_per100k"]
+)
+
+
+def read_table(path=PATH):
+    return pd.read_csv(path, index_col="country")
+
+
+def join(countries, table=None):
+    # (population, people per km2) of every country, in the order of countries
+    table = read_table() if table is None else table
+    table = table.reindex(countries)
+    population = table["population"].values.astype("float64")
+    return population, population / table["area_km2"].values
+
+
+def build(countries, values, daily, table=None):
+    # Counts per 100,000 people, shaped like values (countries, dates, metrics)
+    population, density = join(countries, table)
+    scale = (PER / population)[:, np.newaxis, np.newaxis]
+    return Normalized(
+        population=population,
+        density=density,
+        per100k=values * scale,
+        daily_per100k=daily * scale,
+    )
+
+
+"""
+Examples:
+normalized = population.build(cube.countries, cube.values, derived.daily)
+india_per100k = cube.series("confirmed", "India", normalized.per100k)
+"""
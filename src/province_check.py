@@ -0,0 +1,118 @@
+# Imports
+import sys
+import snapshot
+import clusters
+import maps
+
+# Run from src with `python province_check.py`, this is a check script and not part
+# of the app. It swaps in a snapshot holding a few v2/jhucsse records shaped like
+# upstream's and builds the province maps of the country page from them.
+
+RECORDS = [
+    # Most countries have a single record without a province
+    {
+        "country": "India",
+        "province": None,
+        "stats": {"confirmed": 100, "deaths": 2, "recovered": None},
+        "coordinates": {"latitude": "20.59", "longitude": "78.96"},
+    },
+    {
+        "country": "Canada",
+        "province": "Ontario",
+        "stats": {"confirmed": 50, "deaths": 1, "recovered": None},
+        "coordinates": {"latitude": "51.25", "longitude": "-85.32"},
+    },
+    {
+        "country": "Canada",
+        "province": "Quebec",
+        "stats": {"confirmed": 70, "deaths": 3, "recovered": None},
+        "coordinates": {"latitude": "52.94", "longitude": "-73.55"},
+    },
+]
+
+
+def counties(n):
+    # n places spread over the US, too many to be drawn at once at PROVINCE_ZOOM
+    return [
+        {
+            "country": "US",
+            "province": f"County {i}",
+            "stats": {"confirmed": i + 1, "deaths": 0, "recovered": None},
+            "coordinates": {
+                "latitude": str(30 + (i // 40) * 0.5),
+                "longitude": str(-120 + (i % 40) * 1.0),
+            },
+        }
+        for i in range(n)
+    ]
+
+
+def swap_in(records):
+    snap = snapshot.Snapshot(**{field: None for field in snapshot.Snapshot._fields})
+    snapshot.swap(
+        snap._replace(
+            provinces=snapshot.province_index(records),
+            provinces_version=snapshot.provinces_version(records),
+            coordinates={
+                "India": (20.59, 78.96),
+                "Canada": (56.13, -106.35),
+                "US": (37.09, -95.71),
+            },
+        )
+    )
+
+
+def raises(function):
+    try:
+        function()
+    except Exception:
+        return True
+    return False
+
+
+def check(name, passed):
+    print(f"{'ok' if passed else 'FAILED':<8}{name}")
+    return passed
+
+
+def main():
+    swap_in(RECORDS + counties(2 * clusters.MAX_MARKERS))
+    results = []
+
+    trace = maps.province_map("India", "Confirmed")["data"][0]
+    results.append(
+        check(
+            "a country without provinces gets one marker named after it",
+            [name for name, _ in trace["customdata"]] == ["India"],
+        )
+    )
+    trace = maps.province_map("Canada", "Confirmed")["data"][0]
+    results.append(
+        check("a country with provinces gets a marker each", len(trace["lat"]) == 2)
+    )
+    results.append(
+        check(
+            "a study upstream leaves null raises instead of drawing an empty map",
+            raises(lambda: maps.province_map("Canada", "Recoveries")),
+        )
+    )
+    trace = maps.province_map("US", "Confirmed")["data"][0]
+    results.append(
+        check(
+            "a whole country map is capped and known not to fit",
+            len(trace["lat"]) == clusters.MAX_MARKERS
+            and not maps.fits("US", "Confirmed")
+            and maps.fits("Canada", "Confirmed"),
+        )
+    )
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
+
+
+"""
+Examples:
+python province_check.py
+"""
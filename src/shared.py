@@ -0,0 +1,104 @@
+# Imports
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import store
+
+# The numeric arrays of a store version are written once as .npy files and every
+# gunicorn worker maps them read-only, so the operating system keeps a single copy
+# in its page cache however many workers there are. A worker that starts after the
+# segment was published only attaches to it, nothing is ingested again.
+
+SEGMENT_DIR = os.path.join(store.STORE_DIR, "segments")
+
+
+def segment_path(version, segment_dir=SEGMENT_DIR):
+    return os.path.join(segment_dir, str(version))
+
+
+def attach(version, segment_dir=SEGMENT_DIR, layout=None):
+    # With a layout, a segment written for another layout counts as missing
+    path = segment_path(version, segment_dir)
+    try:
+        with open(os.path.join(path, "labels.json")) as fh:
+            labels = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if layout is not None and labels.get("layout") != layout:
+        return None
+    arrays = {
+        name[: -len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r")
+        for name in os.listdir(path)
+        if name.endswith(".npy")
+    }
+    return arrays, labels
+
+
+def latest(exclude=None, segment_dir=SEGMENT_DIR):
+    # The newest published segment other than exclude, such as the one a new version replaces
+    try:
+        names = os.listdir(segment_dir)
+    except OSError:
+        return None
+    versions = sorted(
+        (int(name) for name in names if name.isdigit() and name != str(exclude)),
+        reverse=True,
+    )
+    for version in versions:
+        segment = attach(version, segment_dir)
+        if segment is not None:
+            return segment
+    return None
+
+
+def publish(version, arrays, labels, segment_dir=SEGMENT_DIR):
+    os.makedirs(segment_dir, exist_ok=True)
+    # Everything is written to a temporary directory which is renamed into place,
+    # so a worker either finds a complete segment or none at all
+    tmp = tempfile.mkdtemp(dir=segment_dir, prefix=".tmp")
+    for name, array in arrays.items():
+        out = np.lib.format.open_memmap(
+            os.path.join(tmp, name + ".npy"),
+            mode="w+",
+            dtype=array.dtype,
+            shape=array.shape,
+        )
+        out[...] = array
+        out.flush()
+        del out
+    with open(os.path.join(tmp, "labels.json"), "w") as fh:
+        json.dump(labels, fh)
+    target = segment_path(version, segment_dir)
+    if os.path.exists(target):
+        # An outdated segment of the same version, workers mapping it keep their mapping
+        shutil.rmtree(target, ignore_errors=True)
+    os.rename(tmp, target)
+
+    # Workers still mapping an older segment keep their mapping after it is removed
+    for name in os.listdir(segment_dir):
+        if name != str(version):
+            shutil.rmtree(os.path.join(segment_dir, name), ignore_errors=True)
+
+
+def load(version, build, segment_dir=SEGMENT_DIR, layout=None):
+    # build returns (arrays, labels) and only runs if no worker published this version
+    # yet, labels has to carry the layout if one is given
+    segment = attach(version, segment_dir, layout)
+    if segment is not None:
+        return segment
+    with store.lock():
+        segment = attach(version, segment_dir, layout)
+        if segment is None:
+            arrays, labels = build()
+            publish(version, arrays, labels, segment_dir)
+            segment = attach(version, segment_dir, layout)
+    return segment
+
+
+"""
+Examples:
+arrays, labels = shared.load(meta["version"], partial(build_segment, meta), layout=2)
+values = arrays["values"]
+"""
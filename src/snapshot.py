@@ -0,0 +1,186 @@
+# Imports
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+import pandas as pd
+import fetch
+import ingest
+
+# A snapshot holds everything the callbacks read, built off the request path.
+# It is never modified after it is built, a refresh builds a new one and swaps
+# the module level reference, so a callback always sees one consistent version.
+
+Snapshot = namedtuple(
+    "Snapshot",
+    [
+        "version",
+        "figures_version",
+        "created",
+        "confirmed_global",
+        "deaths_global",
+        "recovered_global",
+        "country_cases_sorted",
+        "cube",
+        "world",
+        "derived",
+        "world_derived",
+        "indicators",
+        "world_indicators",
+        "normalized",
+        "today_data",
+        "today_country_data",
+        "provinces",
+        "provinces_version",
+        "coordinates",
+    ],
+)
+
+latest = None
+listeners = []
+
+log = logging.getLogger(__name__)
+
+
+def version(store_version, country_cases_sorted, today_data):
+    # The same data gives the same version in every worker, so it can key a shared cache
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(country_cases_sorted).values.tobytes())
+    digest.update(json.dumps(today_data, sort_keys=True).encode("utf-8"))
+    return f"{store_version}-{digest.hexdigest()[:12]}"
+
+
+def figures_version(store_version, country_cases_sorted):
+    # Keys the global figures, which only read the store and cases_country.csv, so
+    # workers that fetched v2/all at different moments still share them
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(country_cases_sorted).values.tobytes())
+    return f"{store_version}-{digest.hexdigest()[:12]}"
+
+
+def province_index(today_country_data):
+    # country -> its province records of v2/jhucsse, grouped once per snapshot
+    index = {}
+    for record in today_country_data:
+        index.setdefault(record["country"], []).append(record)
+    return index
+
+
+def provinces_version(today_country_data):
+    # Only changes with v2/jhucsse, so the province maps outlive the other data
+    digest = hashlib.sha1()
+    digest.update(json.dumps(today_country_data, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def coordinate_index(country_cases_sorted):
+    # country -> (lat, long) from cases_country.csv
+    return dict(
+        zip(
+            country_cases_sorted["country"],
+            zip(
+                country_cases_sorted["Lat"].astype(float),
+                country_cases_sorted["Long_"].astype(float),
+            ),
+        )
+    )
+
+
+def build(max_age=0):
+    results = fetch.run_concurrently(
+        {
+            "global data": lambda: ingest.collect(max_age=max_age),
+            "today data": ingest.get_today_data,
+        }
+    )
+    # Every array is loaded at the store version the frames were read at, even if
+    # another worker refreshes the store while this snapshot is built
+    store_version, (
+        confirmed_global,
+        deaths_global,
+        recovered_global,
+        country_cases_sorted,
+    ) = results["global data"]
+    today_data, today_country_data = results["today data"]
+
+    cube = ingest.load_cube(store_version)
+    derived, world_derived = ingest.load_derived(store_version)
+    indicators, world_indicators = ingest.load_indicators(store_version)
+    normalized = ingest.load_normalized(store_version)
+    # World totals per metric, indexed by date
+    world = ingest.load_world(store_version)
+
+    return Snapshot(
+        version=version(store_version, country_cases_sorted, today_data),
+        figures_version=figures_version(store_version, country_cases_sorted),
+        created=time.time(),
+        confirmed_global=confirmed_global,
+        deaths_global=deaths_global,
+        recovered_global=recovered_global,
+        country_cases_sorted=country_cases_sorted,
+        cube=cube,
+        world=world,
+        derived=derived,
+        world_derived=world_derived,
+        indicators=indicators,
+        world_indicators=world_indicators,
+        normalized=normalized,
+        today_data=today_data,
+        today_country_data=today_country_data,
+        provinces=province_index(today_country_data),
+        provinces_version=provinces_version(today_country_data),
+        coordinates=coordinate_index(country_cases_sorted),
+    )
+
+
+def current():
+    return latest
+
+
+def on_swap(listener):
+    # listener is called with every new snapshot right after it is swapped in
+    listeners.append(listener)
+    return listener
+
+
+def swap(snapshot):
+    global latest
+    latest = snapshot
+    for listener in listeners:
+        listener(snapshot)
+
+
+def refresh(max_age=0):
+    snapshot = build(max_age)
+    swap(snapshot)
+    return snapshot
+
+
+def refresher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            # Another worker may already have refreshed the store during this interval
+            refresh(max_age=interval)
+        except Exception:
+            log.exception(
+                "refresh failed, keeping the snapshot from %s", time.ctime(latest.created)
+            )
+
+
+def start_refresher(interval):
+    thread = threading.Thread(
+        target=refresher, args=(interval,), name="snapshot-refresher", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+"""
+Examples:
+snapshot.refresh()
+snapshot.start_refresher(3600)
+confirmed_global = snapshot.current().confirmed_global
+"""
@@ -0,0 +1,284 @@
+# Imports
+import os
+import io
+import json
+import time
+import logging
+from functools import partial
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import app_vars as av
+import fetch
+
+try:
+    import resource
+except ImportError:
+    # resource is not available on Windows, so the RSS is not reported there
+    resource = None
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) the store is not locked against other processes
+    fcntl = None
+
+# The store keeps one raw binary file per metric, laid out as (dates x countries)
+# so that new days are appended to the end of the file without rewriting history.
+# meta.json records the countries, the dates and when the store was last refreshed.
+# Next to every metric the world total of each date is kept in its own file, summed
+# once when the date is appended, so history is never summed again.
+
+STORE_DIR = os.getenv(
+    "COVIDASH_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "store"),
+)
+
+METRICS = ["confirmed", "deaths", "recovered"]
+
+filenames = {
+    "confirmed": "time_series_covid19_confirmed_global.csv",
+    "deaths": "time_series_covid19_deaths_global.csv",
+    "recovered": "time_series_covid19_recovered_global.csv",
+}
+
+ID_COLUMNS = ["Province/State", "Country/Region", "Lat", "Long"]
+
+# Every count fits comfortably in 32 bits, which halves the size of every frame and of the cube
+DTYPE = "int32"
+
+# The world totals are wider than the per country counts, a sum of int32 can overflow
+WORLD_DTYPE = "int64"
+
+# Bumped whenever the files of the store change, an older store is rebuilt from scratch
+LAYOUT = 2
+
+RSS_BUDGET_MB = float(os.getenv("COVIDASH_RSS_BUDGET_MB", "512"))
+
+log = logging.getLogger(__name__)
+
+
+def meta_path(store_dir=STORE_DIR):
+    return os.path.join(store_dir, "meta.json")
+
+
+def data_path(metric, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{metric}.bin")
+
+
+def world_path(metric, store_dir=STORE_DIR):
+    return os.path.join(store_dir, f"{metric}.world.bin")
+
+
+def read_meta(store_dir=STORE_DIR):
+    try:
+        with open(meta_path(store_dir)) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if meta.get("dtype") != DTYPE or "version" not in meta:
+        return None
+    return meta
+
+
+def write_meta(meta, store_dir=STORE_DIR):
+    # Writing to a temporary file first so readers never see a half written meta.json
+    tmp = meta_path(store_dir) + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, meta_path(store_dir))
+
+
+@contextmanager
+def lock(store_dir=STORE_DIR):
+    # Every gunicorn worker shares the store, only one of them may write to it at a time
+    os.makedirs(store_dir, exist_ok=True)
+    with open(os.path.join(store_dir, ".lock"), "w") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def group_by_country(df):
+    df = df.drop(columns=["Province/State", "Lat", "Long"])
+    df = df.rename(columns={"Country/Region": "country"})
+    df = df.groupby(["country"], as_index=False).sum()
+    return df
+
+
+def read_new_columns(content, known_dates):
+    # Only the id columns and the dates missing from the store are parsed
+    known = set(known_dates)
+    df = pd.read_csv(
+        io.BytesIO(content), usecols=lambda c: c in ID_COLUMNS or c not in known
+    )
+    df = group_by_country(df)
+    values = df[df.columns[1:]].fillna(0)
+    if len(values.columns) and values.values.max() > np.iinfo(DTYPE).max:
+        raise ValueError(f"counts do not fit in {DTYPE}")
+    df[df.columns[1:]] = values.astype(DTYPE)
+    return df
+
+
+def append_metric(metric, df, entry, store_dir=STORE_DIR):
+    n_dates, n_countries = len(entry["dates"]), len(entry["countries"])
+    values = np.ascontiguousarray(df[df.columns[1:]].values.T, dtype=DTYPE)
+    with open(data_path(metric, store_dir), "ab") as fh:
+        # Dropping anything written after the last successful meta update
+        fh.truncate(n_dates * n_countries * np.dtype(DTYPE).itemsize)
+        values.tofile(fh)
+    with open(world_path(metric, store_dir), "ab") as fh:
+        fh.truncate(n_dates * np.dtype(WORLD_DTYPE).itemsize)
+        # Only the new dates are summed, the totals before them are already on disk
+        values.sum(axis=1, dtype=WORLD_DTYPE).tofile(fh)
+    entry["dates"] = entry["dates"] + list(df.columns[1:])
+
+
+def revised_column(metric, df, entry, store_dir=STORE_DIR):
+    # Whether the last stored date of entry differs from its column in df
+    last = entry["dates"][-1]
+    if last not in df.columns:
+        return True
+    stored = open_metric(metric, {"metrics": {metric: entry}}, store_dir)[-1]
+    return not np.array_equal(stored, df[last].values)
+
+
+def refresh_metric(metric, url, entry, store_dir=STORE_DIR):
+    content, changed = fetch.get(url + filenames[metric])
+    if entry is not None and not changed:
+        return entry
+
+    # A copy is updated, refresh compares the new entries with the previous meta
+    entry = dict(entry) if entry is not None else None
+    # The last stored date is parsed again, to catch upstream revising its history
+    df = read_new_columns(content, entry["dates"][:-1] if entry else [])
+    revised = entry is not None and (
+        list(df["country"]) != entry["countries"]
+        or (entry["dates"] and revised_column(metric, df, entry, store_dir))
+    )
+    if entry is not None and entry["dates"] and not revised:
+        df = df.drop(columns=entry["dates"][-1])
+    if entry is None or revised:
+        # The list of countries or a stored date changed upstream, so the whole
+        # history is reread from the content already fetched
+        if entry is not None:
+            df = read_new_columns(content, [])
+        # Counting the rebuilds moves the version even when the dates stay the same
+        revision = entry.get("revision", 0) + 1 if entry is not None else 0
+        entry = {"countries": list(df["country"]), "dates": [], "revision": revision}
+        for path in [data_path(metric, store_dir), world_path(metric, store_dir)]:
+            if os.path.exists(path):
+                os.remove(path)
+    if len(df.columns) > 1:
+        append_metric(metric, df, entry, store_dir)
+    return entry
+
+
+def refresh(url=None, store_dir=STORE_DIR, max_age=0):
+    with lock(store_dir):
+        # Checked again under the lock, another worker may have just refreshed the store
+        return refresh_locked(url, store_dir, max_age)
+
+
+def refresh_locked(url=None, store_dir=STORE_DIR, max_age=0):
+    # The url is looked up on every call, so app_vars can be pointed elsewhere
+    url = av.main_url if url is None else url
+    meta = read_meta(store_dir)
+    current = meta is not None and meta.get("layout") == LAYOUT
+    if current and time.time() - meta["updated"] < max_age:
+        return meta
+
+    previous = meta
+    entries = meta["metrics"] if current else {}
+    meta = {
+        "dtype": DTYPE,
+        "layout": LAYOUT,
+        "metrics": fetch.run_concurrently(
+            {
+                metric: partial(
+                    refresh_metric, metric, url, entries.get(metric), store_dir
+                )
+                for metric in METRICS
+            }
+        ),
+        "updated": time.time(),
+    }
+    # The version only moves when the stored series actually changed
+    meta["version"] = previous["version"] if previous is not None else 0
+    if previous is None or meta["metrics"] != previous["metrics"]:
+        meta["version"] += 1
+    write_meta(meta, store_dir)
+    return meta
+
+
+def version(store_dir=STORE_DIR):
+    meta = read_meta(store_dir)
+    return meta["version"] if meta is not None else None
+
+
+def open_metric(metric, meta, store_dir=STORE_DIR):
+    entry = meta["metrics"][metric]
+    return np.memmap(
+        data_path(metric, store_dir),
+        dtype=DTYPE,
+        mode="r",
+        shape=(len(entry["dates"]), len(entry["countries"])),
+    )
+
+
+def open_world(metric, meta, store_dir=STORE_DIR):
+    # The world total of every date of the metric, in the order of meta's dates
+    return np.memmap(
+        world_path(metric, store_dir),
+        dtype=WORLD_DTYPE,
+        mode="r",
+        shape=(len(meta["metrics"][metric]["dates"]),),
+    )
+
+
+def load_metric(metric, meta, store_dir=STORE_DIR):
+    entry = meta["metrics"][metric]
+    # copy=False keeps the frame a view of the memory mapped file, shared by every worker
+    df = pd.DataFrame(
+        open_metric(metric, meta, store_dir).T, columns=entry["dates"], copy=False
+    )
+    df.insert(0, "country", pd.Categorical(entry["countries"]))
+    return df
+
+
+def load(store_dir=STORE_DIR, meta=None):
+    # meta picks the version read, the latest one by default
+    meta = read_meta(store_dir) if meta is None else meta
+    if meta is None:
+        meta = refresh(store_dir=store_dir)
+    return tuple(load_metric(metric, meta, store_dir) for metric in METRICS)
+
+
+def report_memory(frames):
+    # frames maps a name to a DataFrame or an array, the sizes are logged in MB
+    usage = {}
+    for name, frame in frames.items():
+        if isinstance(frame, pd.DataFrame):
+            usage[name] = frame.memory_usage(deep=True).sum() / 2 ** 20
+        else:
+            usage[name] = frame.nbytes / 2 ** 20
+        log.info("%s uses %.2f MB", name, usage[name])
+
+    if resource is None:
+        return usage
+
+    # ru_maxrss is the peak resident set size of this process, in KB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+    log.info("peak RSS is %.1f MB (budget %.0f MB)", rss, RSS_BUDGET_MB)
+    if rss > RSS_BUDGET_MB:
+        log.warning("peak RSS of %.1f MB is over the %.0f MB budget", rss, RSS_BUDGET_MB)
+    return usage
+
+
+"""
+Examples:
+store.refresh(max_age=3600)
+confirmed_global, deaths_global, recovered_global = store.load()
+store.report_memory({"confirmed_global": confirmed_global})
+world_confirmed = store.open_world("confirmed", store.read_meta())
+"""
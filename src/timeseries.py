@@ -5,44 +5,49 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 from datetime import date
-import app_vars as av
+from functools import lru_cache
+import snapshot
+import downsample
+
+
+@lru_cache(maxsize=1024)
+def country_series(version, metric, country, daily):
+    # version only keys the cache, the series is a view into the current snapshot's arrays
+    snap = snapshot.current()
+    values = snap.derived.daily if daily else None
+    return pd.Series(
+        snap.cube.series(metric, country, values),
+        index=snap.cube.dates,
+        name=metric,
+        copy=False,
+    )
 
-confirmed_global, deaths_global, recovered_global, country_cases_sorted = (
-    av.confirmed_global,
-    av.deaths_global,
-    av.recovered_global,
-    av.country_cases_sorted,
-)
 
+# Every entry maps the segment of its version, so the entries of the previous version
+# are dropped on a swap rather than keeping its deleted files mapped until evicted
+snapshot.on_swap(lambda new_snapshot: country_series.cache_clear())
 
-def get_new_cases(country):
-    time_series = confirmed_global.melt(
-        id_vars=["country"], var_name="date", value_name="cases"
-    )
-    time_series = time_series[time_series["country"] == country]
-    time_series = time_series.drop(["country"], axis=1)
-    time_series.index = [x for x in range(len(time_series))]
-    return time_series
 
+def get_country_series(metric, country, daily=False):
+    return country_series(snapshot.current().version, metric, country, daily)
 
-def get_new_deaths(country):
-    time_series = deaths_global.melt(
-        id_vars=["country"], var_name="date", value_name="cases"
-    )
-    time_series = time_series[time_series["country"] == country]
-    time_series = time_series.drop(["country"], axis=1)
-    time_series.index = [x for x in range(len(time_series))]
+
+def get_country_timeseries(metric, country, daily=False):
+    series = get_country_series(metric, country, daily)
+    time_series = pd.DataFrame({"date": series.index, "cases": series.values})
     return time_series
 
 
-def get_new_recoveries(country):
-    time_series = recovered_global.melt(
-        id_vars=["country"], var_name="date", value_name="cases"
-    )
-    time_series = time_series[time_series["country"] == country]
-    time_series = time_series.drop(["country"], axis=1)
-    time_series.index = [x for x in range(len(time_series))]
-    return time_series
+def get_new_cases(country, daily=False):
+    return get_country_timeseries("confirmed", country, daily)
+
+
+def get_new_deaths(country, daily=False):
+    return get_country_timeseries("deaths", country, daily)
+
+
+def get_new_recoveries(country, daily=False):
+    return get_country_timeseries("recovered", country, daily)
 
 
 def get_plot(time_series, name):
@@ -62,11 +67,10 @@ def plot_timeseries(country_name, func_name, title, n=-20, daily=False):
     if not daily:
         new_confirmed_cases = func_name(country_name)[n:]
     else:
-        confirmed_cases = func_name(country_name)
-        cases = confirmed_cases["cases"].diff()[1:]
-        new_confirmed_cases = confirmed_cases[1:]
-        new_confirmed_cases["cases"] = cases
-        new_confirmed_cases = new_confirmed_cases[n:]
+        # The daily counts are precomputed with the snapshot, the first day has no previous day
+        new_confirmed_cases = func_name(country_name, daily=True)[1:][n:]
+    # Only a long history is thinned out, the last weeks are drawn day by day
+    new_confirmed_cases = downsample.frame(new_confirmed_cases, "cases")
     fig = get_plot(new_confirmed_cases, str(func_name))
     fig.update_layout(
         template="plotly_dark",
@@ -77,24 +81,28 @@ def plot_timeseries(country_name, func_name, title, n=-20, daily=False):
     return fig
 
 
-def get_world_timeseries(df):
-    data = df.sum()
-    data = data[1:]
-    data = pd.DataFrame(data={"Date": data.index, "Cases": data})
+def get_world_timeseries(name):
+    # The world totals are kept up to date by the store, nothing is summed here
+    data = snapshot.current().world[name]
+    data = pd.DataFrame(data={"Date": data.index, "Cases": data.values})
     return data
 
 
-def plot_world_timeseries(df, name, n=-20, daily=False):
+def plot_world_timeseries(name, n=-20, daily=False):
     data, new_data = None, None
     if not daily:
-        new_data = get_world_timeseries(df)[n:]
-        data = get_world_timeseries(df)
+        data = get_world_timeseries(name)
+        new_data = data[n:]
     else:
-        data = get_world_timeseries(df)
-        cases = data["Cases"].diff()[1:]
-        new_data = data[1:]
-        new_data["Cases"] = cases
-        new_data = new_data[n:]
+        snap = snapshot.current()
+        data = pd.DataFrame(
+            {
+                "Date": snap.cube.dates,
+                "Cases": snap.world_derived.daily[0, :, snap.cube.metric_index[name]],
+            }
+        )
+        new_data = data[1:][n:]
+    new_data = downsample.frame(new_data, "Cases")
     color = (
         "#f54842"
         if "deaths" == name
@@ -114,6 +122,8 @@ def plot_world_timeseries(df, name, n=-20, daily=False):
 
 """
 Examples:
+series = get_country_series("deaths", "India", daily=True)
 fig = plot_timeseries("US", get_new_cases, "Confirmed Cases")
 fig = plot_timeseries("India", get_new_recoveries, "Recoveries", n=-20, daily=True)
+fig = plot_world_timeseries("confirmed", n=-20, daily=False)
 """